@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+from finite_state_machine import StateMachine, transition
+
+
+def always_true(machine, *args, **kwargs):
+    return True
+
+
+def always_false(machine, *args, **kwargs):
+    return False
+
+
+async def async_always_true(machine, *args, **kwargs):
+    return True
+
+
+def make_transition(name, source, target, is_async=False, **kwargs):
+    if is_async:
+
+        async def func(self, *args, **kwargs):
+            pass
+
+    else:
+
+        def func(self, *args, **kwargs):
+            pass
+
+    func.__name__ = func.__qualname__ = name
+    return transition(source=source, target=target, **kwargs)(func)
+
+
+def make_state_machine(num_states, sources_per_transition=1):
+    """Synthetic State Machine with a chain of `num_states` states
+
+    Each state has a transition to the next one that can also be taken
+    from the `sources_per_transition - 1` states before it.
+    """
+    namespace = {}
+    for i in range(num_states):
+        source = [
+            f"state_{(i - j) % num_states}" for j in range(sources_per_transition)
+        ]
+        name = f"to_state_{(i + 1) % num_states}"
+        namespace[name] = make_transition(
+            name, source, f"state_{(i + 1) % num_states}", on_error="failed"
+        )
+
+    def __init__(self):
+        self.state = "state_0"
+        super(cls, self).__init__()
+
+    namespace["__init__"] = __init__
+    cls = type(f"Chain{num_states}", (StateMachine,), namespace)
+    return cls
+
+
+@pytest.fixture
+def run_async():
+    """Run `coroutine_function(*args)` `times` times on one event loop"""
+    loop = asyncio.new_event_loop()
+
+    def run(coroutine_function, *args, times=1000):
+        async def run_many():
+            for _ in range(times):
+                await coroutine_function(*args)
+
+        loop.run_until_complete(run_many())
+
+    yield run
+    loop.close()
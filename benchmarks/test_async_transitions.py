@@ -0,0 +1,62 @@
+"""Each benchmark round awaits the transition 1000 times on one event loop"""
+
+import pytest
+
+from finite_state_machine import StateMachine
+from finite_state_machine.exceptions import InvalidStartState
+from .conftest import always_true, async_always_true, make_transition
+
+pytestmark = pytest.mark.benchmark(group="async transitions")
+
+
+def make_machine(**transition_kwargs):
+    class LightSwitch(StateMachine):
+        def __init__(self):
+            self.state = "off"
+            super().__init__()
+
+        flip = make_transition("flip", "off", "off", is_async=True, **transition_kwargs)
+        turn_on = make_transition("turn_on", "on", "on", is_async=True)
+
+    return LightSwitch()
+
+
+@pytest.mark.parametrize("num_args", [0, 1, 3])
+def test_arity(benchmark, run_async, num_args):
+    machine = make_machine()
+
+    benchmark(run_async, machine.flip, *range(num_args))
+
+
+@pytest.mark.parametrize("num_conditions", [1, 5])
+@pytest.mark.parametrize("condition", [always_true, async_always_true])
+def test_conditions(benchmark, run_async, condition, num_conditions):
+    machine = make_machine(conditions=[condition] * num_conditions)
+
+    benchmark(run_async, machine.flip)
+
+
+def test_concurrent_conditions(benchmark, run_async):
+    machine = make_machine(
+        conditions=[async_always_true] * 5, concurrent_conditions=True
+    )
+
+    benchmark(run_async, machine.flip)
+
+
+def test_on_error_success(benchmark, run_async):
+    machine = make_machine(on_error="failed")
+
+    benchmark(run_async, machine.flip)
+
+
+def test_reject_invalid_start_state(benchmark, run_async):
+    machine = make_machine()
+
+    async def attempt():
+        try:
+            await machine.turn_on()
+        except InvalidStartState:
+            pass
+
+    benchmark(run_async, attempt)
@@ -0,0 +1,33 @@
+import pytest
+
+from finite_state_machine import StateMachine
+from .conftest import make_state_machine
+
+pytestmark = pytest.mark.benchmark(group="construction")
+
+
+class LightSwitch(StateMachine):
+    def __init__(self):
+        self.state = "off"
+        super().__init__()
+
+
+class SlottedLightSwitch(StateMachine):
+    __slots__ = ("state",)
+
+    def __init__(self):
+        self.state = "off"
+        super().__init__()
+
+
+def test_construct_machine(benchmark):
+    benchmark(LightSwitch)
+
+
+def test_construct_slotted_machine(benchmark):
+    benchmark(SlottedLightSwitch)
+
+
+def test_define_large_machine_class(benchmark):
+    """Class creation compiles the transition tables"""
+    benchmark(make_state_machine, 200, 5)
@@ -0,0 +1,15 @@
+import pytest
+
+from finite_state_machine.draw_state_diagram import generate_state_diagram_markdown
+from .conftest import make_state_machine
+
+pytestmark = pytest.mark.benchmark(group="state diagram")
+
+
+@pytest.mark.parametrize(
+    "num_states,sources_per_transition", [(10, 1), (200, 1), (200, 20)]
+)
+def test_generate_state_diagram_markdown(benchmark, num_states, sources_per_transition):
+    cls = make_state_machine(num_states, sources_per_transition)
+
+    benchmark(generate_state_diagram_markdown, cls, initial_state="state_0")
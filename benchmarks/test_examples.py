@@ -0,0 +1,47 @@
+"""Workloads built from the State Machines in the examples folder"""
+
+from collections import namedtuple
+
+import pytest
+
+from examples.boolean_field import EnableFeatureStateMachine
+from examples.github_pull_request import GitHubPullRequest
+from examples.turnstile import Turnstile
+
+pytestmark = pytest.mark.benchmark(group="examples")
+
+Account = namedtuple("Account", "feature bills_outstanding")
+User = namedtuple("User", "name github_id is_admin")
+
+
+def test_turnstile(benchmark):
+    def workload():
+        turnstile = Turnstile()
+        turnstile.insert_coin()
+        turnstile.insert_coin()
+        turnstile.pass_thru()
+
+    benchmark(workload)
+
+
+def test_github_pull_request(benchmark):
+    user = User(name="Aly Sivji", github_id="alysivji", is_admin=False)
+
+    def workload():
+        pull_request = GitHubPullRequest()
+        pull_request.request_changes()
+        pull_request.approve()
+        pull_request.merge_pull_request(user)
+
+    benchmark(workload)
+
+
+def test_enable_feature(benchmark):
+    account = Account(feature={"enabled": False}, bills_outstanding=[])
+
+    def workload():
+        machine = EnableFeatureStateMachine(account)
+        machine.enable_feature()
+        machine.disable_feature()
+
+    benchmark(workload)
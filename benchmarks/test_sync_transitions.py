@@ -0,0 +1,104 @@
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.exceptions import ConditionsNotMet, InvalidStartState
+from .conftest import always_false, always_true, make_transition
+
+pytestmark = pytest.mark.benchmark(group="sync transitions")
+
+
+def make_machine(**transition_kwargs):
+    class LightSwitch(StateMachine):
+        def __init__(self):
+            self.state = "off"
+            super().__init__()
+
+        # same source and target so the transition can be called repeatedly
+        flip = make_transition("flip", "off", "off", **transition_kwargs)
+        turn_on = make_transition("turn_on", "on", "on", **transition_kwargs)
+
+    return LightSwitch()
+
+
+@pytest.mark.parametrize("num_args", [0, 1, 3])
+def test_arity(benchmark, num_args):
+    machine = make_machine()
+    args = tuple(range(num_args))
+
+    benchmark(machine.flip, *args)
+
+
+def test_keyword_arguments(benchmark):
+    machine = make_machine()
+
+    benchmark(machine.flip, 1, user="admin")
+
+
+@pytest.mark.parametrize("num_conditions", [1, 5])
+@pytest.mark.parametrize("conditions_mode", ["all", "fail_fast", "adaptive"])
+def test_conditions(benchmark, num_conditions, conditions_mode):
+    machine = make_machine(
+        conditions=[always_true] * num_conditions, conditions_mode=conditions_mode
+    )
+
+    benchmark(machine.flip, 1)
+
+
+def test_on_error_success(benchmark):
+    machine = make_machine(on_error="failed")
+
+    benchmark(machine.flip)
+
+
+def test_on_error_fallback(benchmark):
+    class Machine(StateMachine):
+        def __init__(self):
+            self.state = "off"
+            super().__init__()
+
+        @transition(source="off", target="off", on_error="off")
+        def fail(self):
+            raise ValueError
+
+    machine = Machine()
+
+    benchmark(machine.fail)
+
+
+def test_reject_invalid_start_state(benchmark):
+    machine = make_machine()
+
+    def attempt():
+        try:
+            machine.turn_on()
+        except InvalidStartState:
+            pass
+
+    benchmark(attempt)
+
+
+@pytest.mark.parametrize("conditions_mode", ["all", "fail_fast"])
+def test_reject_conditions_not_met(benchmark, conditions_mode):
+    machine = make_machine(
+        conditions=[always_false] * 3, conditions_mode=conditions_mode
+    )
+
+    def attempt():
+        try:
+            machine.flip()
+        except ConditionsNotMet:
+            pass
+
+    benchmark(attempt)
+
+
+def test_reject_can(benchmark):
+    machine = make_machine()
+
+    benchmark(type(machine).turn_on.can, machine)
+
+
+def test_reject_try(benchmark):
+    machine = make_machine()
+
+    benchmark(type(machine).turn_on.try_, machine)
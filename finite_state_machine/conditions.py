@@ -0,0 +1,306 @@
+import asyncio
+from collections import OrderedDict
+import functools
+import threading
+import time
+from typing import NamedTuple, Optional
+
+CONDITIONS_MODES = ("all", "fail_fast", "adaptive")
+
+
+def sync_checker(conditions, mode):
+    """Build a function that evaluates conditions for a sync transition
+
+    The checker is called with the transition's (args, kwargs) and returns
+    the list of conditions that did not return True (empty when all passed).
+    """
+    if mode == "adaptive":
+        return AdaptiveOrder(conditions).check
+
+    if mode == "fail_fast":
+
+        def check(args, kwargs):
+            for condition in conditions:
+                if condition(*args, **kwargs) is not True:
+                    return [condition]
+            return []
+
+        return check
+
+    def check(args, kwargs):
+        conditions_not_met = []
+        for condition in conditions:
+            if condition(*args, **kwargs) is not True:
+                conditions_not_met.append(condition)
+        return conditions_not_met
+
+    return check
+
+
+def async_checker(conditions, mode, concurrent=False):
+    """Coroutine version of `sync_checker`; conditions can be sync or async
+
+    With `concurrent`, async conditions run at the same time instead of
+    one after the other.
+    """
+    if concurrent:
+        return concurrent_checker(conditions, fail_fast=mode == "fail_fast")
+
+    if mode == "adaptive":
+        return AdaptiveOrder(conditions).acheck
+
+    # classify conditions once instead of on every call
+    conditions = [
+        (condition, asyncio.iscoroutinefunction(condition)) for condition in conditions
+    ]
+    fail_fast = mode == "fail_fast"
+
+    async def check(args, kwargs):
+        conditions_not_met = []
+        for condition, is_coroutine in conditions:
+            if is_coroutine:
+                condition_result = await condition(*args, **kwargs)
+            else:
+                condition_result = condition(*args, **kwargs)
+            if condition_result is not True:
+                conditions_not_met.append(condition)
+                if fail_fast:
+                    break
+        return conditions_not_met
+
+    return check
+
+
+def concurrent_checker(conditions, fail_fast):
+    """Evaluate sync conditions inline, then run async conditions as tasks
+
+    In fail_fast mode the remaining tasks are cancelled as soon as one
+    condition does not return True.
+    """
+    position = {condition: i for i, condition in enumerate(conditions)}
+    sync_conditions = []
+    async_conditions = []
+    for condition in conditions:
+        if asyncio.iscoroutinefunction(condition):
+            async_conditions.append(condition)
+        else:
+            sync_conditions.append(condition)
+    return_when = asyncio.FIRST_COMPLETED if fail_fast else asyncio.ALL_COMPLETED
+
+    async def check(args, kwargs):
+        conditions_not_met = []
+        for condition in sync_conditions:
+            if condition(*args, **kwargs) is not True:
+                conditions_not_met.append(condition)
+                if fail_fast:
+                    return conditions_not_met
+        if not async_conditions:
+            return conditions_not_met
+
+        tasks = {
+            asyncio.ensure_future(condition(*args, **kwargs)): condition
+            for condition in async_conditions
+        }
+        pending = set(tasks)
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=return_when)
+                # retrieve every exception so none are reported as unhandled
+                errors = [task.exception() for task in done]
+                for error in errors:
+                    if error is not None:
+                        raise error
+                for task in done:
+                    if task.result() is not True:
+                        conditions_not_met.append(tasks[task])
+                if fail_fast and conditions_not_met:
+                    break
+        finally:
+            if pending:
+                for task in pending:
+                    task.cancel()
+                await asyncio.wait(pending)
+
+        conditions_not_met.sort(key=position.__getitem__)
+        return conditions_not_met
+
+    return check
+
+
+class AdaptiveOrder:
+    """Fail-fast condition evaluation that reorders conditions as it goes
+
+    Every `interval` evaluations the conditions are sorted by observed
+    time spent per rejection, so cheap conditions that often return False
+    run first. Conditions that haven't run yet are moved to the front so
+    they get measured, even behind a condition that always rejects.
+    Conditions that never rejected keep their relative order at the end.
+    """
+
+    interval = 128
+
+    def __init__(self, conditions):
+        self.order = list(conditions)
+        self.is_coroutine = {
+            condition: asyncio.iscoroutinefunction(condition)
+            for condition in conditions
+        }
+        # condition -> [calls, rejections, seconds]
+        self.stats = {condition: [0, 0, 0.0] for condition in conditions}
+        self.evaluations = 0
+
+    def reorder(self):
+        def cost_per_rejection(condition):
+            calls, rejections, seconds = self.stats[condition]
+            if not calls:
+                return -1.0
+            if not rejections:
+                return float("inf")
+            return seconds / rejections
+
+        # build a new list so concurrent evaluations keep a consistent order
+        self.order = sorted(self.order, key=cost_per_rejection)
+
+    def check(self, args, kwargs):
+        self.evaluations += 1
+        if self.evaluations % self.interval == 0:
+            self.reorder()
+
+        for condition in self.order:
+            start = time.perf_counter()
+            passed = condition(*args, **kwargs) is True
+            stats = self.stats[condition]
+            stats[0] += 1
+            stats[2] += time.perf_counter() - start
+            if not passed:
+                stats[1] += 1
+                return [condition]
+        return []
+
+    async def acheck(self, args, kwargs):
+        self.evaluations += 1
+        if self.evaluations % self.interval == 0:
+            self.reorder()
+
+        for condition in self.order:
+            start = time.perf_counter()
+            if self.is_coroutine[condition]:
+                passed = await condition(*args, **kwargs) is True
+            else:
+                passed = condition(*args, **kwargs) is True
+            stats = self.stats[condition]
+            stats[0] += 1
+            stats[2] += time.perf_counter() - start
+            if not passed:
+                stats[1] += 1
+                return [condition]
+        return []
+
+
+class CacheInfo(NamedTuple):
+    hits: int
+    misses: int
+    maxsize: Optional[int]
+    currsize: int
+
+
+def cached_condition(ttl=None, maxsize=128, key=None):
+    """Cache the result of a (sync or async) condition function
+
+    Results are cached per state machine instance and current state, plus
+    `key(machine, *args, **kwargs)` when given (by default the remaining
+    positional and keyword arguments). Entries expire after `ttl` seconds
+    and the least recently used entry is evicted past `maxsize` entries;
+    None disables either limit.
+
+    The cached condition has `cache_info()` and `cache_clear()`, like
+    `functools.lru_cache`.
+    """
+    if ttl is not None and ttl <= 0:
+        raise ValueError("ttl must be a positive number of seconds")
+    if maxsize is not None and maxsize <= 0:
+        raise ValueError("maxsize must be a positive integer")
+
+    def decorator(condition):
+        cache = _ConditionCache(ttl, maxsize)
+
+        def make_key(args, kwargs):
+            machine = args[0]
+            if key is None:
+                extra = (args[1:], tuple(sorted(kwargs.items())))
+            else:
+                extra = key(*args, **kwargs)
+            return (id(machine), machine.state, extra)
+
+        if asyncio.iscoroutinefunction(condition):
+
+            @functools.wraps(condition)
+            async def cached(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                found, result = cache.get(cache_key)
+                if found:
+                    return result
+                result = await condition(*args, **kwargs)
+                cache.set(cache_key, args[0], result)
+                return result
+
+        else:
+
+            @functools.wraps(condition)
+            def cached(*args, **kwargs):
+                cache_key = make_key(args, kwargs)
+                found, result = cache.get(cache_key)
+                if found:
+                    return result
+                result = condition(*args, **kwargs)
+                cache.set(cache_key, args[0], result)
+                return result
+
+        cached.cache_info = cache.info
+        cached.cache_clear = cache.clear
+        return cached
+
+    return decorator
+
+
+class _ConditionCache:
+    def __init__(self, ttl, maxsize):
+        self.ttl = ttl
+        self.maxsize = maxsize
+        # key -> (expires at, machine, result); the machine is kept so its
+        # id() can't be reused by another instance while the entry exists
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                expires_at, machine, result = entry
+                if expires_at is None or expires_at > time.monotonic():
+                    self.entries.move_to_end(key)
+                    self.hits += 1
+                    return True, result
+                del self.entries[key]
+            self.misses += 1
+            return False, None
+
+    def set(self, key, machine, result):
+        expires_at = None if self.ttl is None else time.monotonic() + self.ttl
+        with self.lock:
+            self.entries[key] = (expires_at, machine, result)
+            self.entries.move_to_end(key)
+            if self.maxsize is not None and len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def info(self):
+        with self.lock:
+            return CacheInfo(self.hits, self.misses, self.maxsize, len(self.entries))
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
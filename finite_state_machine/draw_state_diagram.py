@@ -1,6 +1,5 @@
 import argparse
 import importlib
-import inspect
 import os
 import sys
 from typing import List
@@ -27,9 +26,8 @@ def generate_state_diagram_markdown(cls, initial_state):
     https://mermaid-js.github.io/mermaid/diagrams-and-syntax-and-examples/stateDiagram.html
     """
 
-    class_fns = inspect.getmembers(cls, predicate=inspect.isfunction)
     state_transitions: List[TransitionDetails] = [
-        func._fsm for name, func in class_fns if hasattr(func, "_fsm")
+        details for name, details in sorted(cls._fsm_transitions.items())
     ]
 
     transition_template = "    {source} --> {target} : {name}\n"
@@ -66,11 +64,10 @@ def generate_state_diagram_markdown(cls, initial_state):
                 )
                 all_state_transitions.append(t)
 
-        mermaid_markdown = "stateDiagram-v2\n"
-        if initial_state:
-            mermaid_markdown += f"    [*] --> {initial_state}\n"
-        for t in all_state_transitions:
-            mermaid_markdown += t
+    mermaid_markdown = "stateDiagram-v2\n"
+    if initial_state:
+        mermaid_markdown += f"    [*] --> {initial_state}\n"
+    mermaid_markdown += "".join(all_state_transitions)
 
     return mermaid_markdown
 
@@ -2,12 +2,115 @@ class TransitionNotAllowed(Exception):
     pass
 
 
+# Exceptions below keep their details in `args` (stored by the C-level
+# Exception.__new__) and build their message in __str__, so rejected
+# transitions don't pay for a Python __init__ or string formatting.
+# Raised with other arguments, e.g. a message, they behave like Exception.
+
+
 class InvalidStartState(TransitionNotAllowed):
-    pass
+    """InvalidStartState(state, transition_name, source)"""
+
+    @property
+    def state(self):
+        return self.args[0]
+
+    @property
+    def transition_name(self):
+        return self.args[1]
+
+    @property
+    def source(self):
+        return self.args[2]
+
+    def __str__(self):
+        if len(self.args) != 3:
+            return super().__str__()
+        return (
+            f"Current state is {self.state}. "
+            f"{self.transition_name} allows transitions from {self.source}."
+        )
 
 
 class ConditionsNotMet(TransitionNotAllowed):
-    def __init__(self, conditions):
-        conditions_not_met = ", ".join(condition.__name__ for condition in conditions)
-        message = f"Following conditions did not return True: {conditions_not_met}"
-        super().__init__(message)
+    """ConditionsNotMet(conditions)"""
+
+    @property
+    def conditions(self):
+        return self.args[0]
+
+    def __str__(self):
+        if len(self.args) != 1 or isinstance(self.args[0], str):
+            return super().__str__()
+        conditions_not_met = ", ".join(
+            condition.__name__ for condition in self.conditions
+        )
+        return f"Following conditions did not return True: {conditions_not_met}"
+
+
+class StaleTransition(TransitionNotAllowed):
+    """StaleTransition(state, transition_name, start_state)
+
+    Raised by thread-safe machines when the state changed while the
+    transition was running, see `StateMachine.compare_and_set_state`.
+    """
+
+    @property
+    def state(self):
+        return self.args[0]
+
+    @property
+    def transition_name(self):
+        return self.args[1]
+
+    @property
+    def start_state(self):
+        return self.args[2]
+
+    def __str__(self):
+        if len(self.args) != 3:
+            return super().__str__()
+        return (
+            f"State changed from {self.start_state} to {self.state} "
+            f"while {self.transition_name} was running."
+        )
+
+
+class TransitionTimeout(TimeoutError):
+    """TransitionTimeout(transition_name, timeout)
+
+    Raised when an async transition with a `timeout` did not finish in
+    time and has no on_error state.
+    """
+
+    @property
+    def transition_name(self):
+        return self.args[0]
+
+    @property
+    def timeout(self):
+        return self.args[1]
+
+    def __str__(self):
+        if len(self.args) != 2:
+            return super().__str__()
+        return f"{self.transition_name} did not finish within {self.timeout}s."
+
+
+class VersionConflict(Exception):
+    """VersionConflict(keys)
+
+    Raised by a state store when saved states were changed by someone
+    else since they were loaded; `keys` are the `(kind, machine_id)` of
+    the conflicting rows. Nothing was saved.
+    """
+
+    @property
+    def keys(self):
+        return self.args[0]
+
+    def __str__(self):
+        if len(self.args) != 1 or isinstance(self.args[0], str):
+            return super().__str__()
+        keys = ", ".join(f"{kind}:{machine_id}" for kind, machine_id in self.keys)
+        return f"States changed since they were loaded: {keys}"
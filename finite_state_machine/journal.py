@@ -0,0 +1,291 @@
+import asyncio
+import json
+import struct
+import threading
+import time
+from typing import Any, NamedTuple
+
+from .observers import TransitionObserver
+from .state_machine import _state_value
+
+FORMATS = ("jsonl", "binary")
+OUTCOMES = ("ok", "rejected", "error")
+
+# binary journals start with this header, followed by frames of a
+# little-endian uint32 length and the record
+BINARY_MAGIC = b"FSMJ\x01\n"
+_LENGTH = struct.Struct("<I")
+_RECORD_HEADER = struct.Struct("<dB")  # timestamp, outcome index
+_INT = struct.Struct("<q")
+_SIZE = struct.Struct("<I")
+
+
+class JournalRecord(NamedTuple):
+    machine_id: Any
+    transition: str
+    source: Any
+    target: Any  # state of the machine after the transition was called
+    timestamp: float  # time.time()
+    outcome: str  # one of OUTCOMES
+
+
+class TransitionJournal(TransitionObserver):
+    """Observer that appends every transition to a journal file
+
+    Records are buffered in memory and written in batches by `flush`,
+    which runs when `batch_size` records are buffered (in the thread
+    started by `start`, or the task running `run`), every
+    `flush_interval` seconds, and on `close`. `machine_id(machine)`
+    identifies machines in the journal; use a stable id to replay it in
+    another process.
+
+    Enum states are written as their value, and other values that the
+    format can't represent (e.g. UUID machine ids) with str(). Records
+    that still can't be encoded are dropped and counted in `dropped`;
+    the last flush error is kept in `last_error`.
+    """
+
+    def __init__(
+        self,
+        path,
+        format="jsonl",
+        machine_id=id,
+        batch_size=1024,
+        flush_interval=1.0,
+    ):
+        if format not in FORMATS:
+            raise ValueError(f"format must be one of {FORMATS}")
+        self.path = path
+        self.format = format
+        self.machine_id = machine_id
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+
+        self._buffer = []
+        self._buffer_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = threading.Event()
+        self._thread = None
+        self.dropped = 0
+        self.last_error = None
+
+        self._file = open(path, "ab")
+        if format == "binary" and self._file.tell() == 0:
+            self._file.write(BINARY_MAGIC)
+            self._file.flush()
+
+    def _record(self, event, outcome):
+        record = (
+            self.machine_id(event.machine),
+            event.name,
+            event.source,
+            event.machine.state,
+            time.time(),
+            outcome,
+        )
+        with self._buffer_lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self._wake.set()
+
+    def on_end(self, event):
+        self._record(event, 0)
+
+    def on_reject(self, event):
+        self._record(event, 1)
+
+    def on_error(self, event):
+        self._record(event, 2)
+
+    def flush(self):
+        """Write buffered records to the file
+
+        If writing fails, the records go back to the front of the buffer
+        and the error is raised.
+        """
+        encode = _encode_json if self.format == "jsonl" else _encode_binary
+        with self._write_lock:
+            with self._buffer_lock:
+                records, self._buffer = self._buffer, []
+            if not records or self._file.closed:
+                return
+
+            encoded = []
+            for record in records:
+                try:
+                    encoded.append((record, encode(record)))
+                except Exception as error:
+                    self.dropped += 1
+                    self.last_error = error
+            try:
+                self._file.write(b"".join(data for _, data in encoded))
+                self._file.flush()
+            except Exception as error:
+                self.last_error = error
+                with self._buffer_lock:
+                    self._buffer[:0] = [record for record, _ in encoded]
+                raise
+
+    def start(self):
+        """Flush from a background thread"""
+        if self._thread is not None:
+            raise RuntimeError("flusher thread already started")
+        self._thread = threading.Thread(target=self._flush_loop, daemon=True)
+        self._thread.start()
+
+    def _flush_loop(self):
+        while not self._closed.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                # kept in last_error; the records are retried next time
+                pass
+
+    async def run(self):
+        """Flush from an asyncio task until `close`; waiting and writes
+        happen in the loop's default executor"""
+        loop = asyncio.get_event_loop()
+        while not self._closed.is_set():
+            await loop.run_in_executor(None, self._wake.wait, self.flush_interval)
+            self._wake.clear()
+            try:
+                await loop.run_in_executor(None, self.flush)
+            except Exception:
+                # kept in last_error; the records are retried next time
+                pass
+
+    def close(self):
+        """Stop the flusher, write buffered records, and close the file"""
+        if self._file.closed:
+            return
+        self._closed.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        try:
+            self.flush()
+        finally:
+            with self._write_lock:
+                self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def read_journal(path):
+    """Stream JournalRecords from a JSONL or binary journal"""
+    with open(path, "rb") as f:
+        if f.read(len(BINARY_MAGIC)) == BINARY_MAGIC:
+            yield from _read_binary(f)
+            return
+        f.seek(0)
+        for line in f:
+            if line.strip():
+                data = json.loads(line)
+                yield JournalRecord(
+                    data["machine"],
+                    data["transition"],
+                    data["source"],
+                    data["target"],
+                    data["timestamp"],
+                    data["outcome"],
+                )
+
+
+def replay(path):
+    """Current state of every machine in a journal: {machine id: state}"""
+    states = {}
+    for record in read_journal(path):
+        states[record.machine_id] = record.target
+    return states
+
+
+def _encode_json(record):
+    machine_id, transition, source, target, timestamp, outcome = record
+    data = {
+        "machine": machine_id,
+        "transition": transition,
+        "source": _state_value(source),
+        "target": _state_value(target),
+        "timestamp": timestamp,
+        "outcome": OUTCOMES[outcome],
+    }
+    return json.dumps(data, separators=(",", ":"), default=str).encode() + b"\n"
+
+
+# binary values: a type tag followed by the value
+_NONE, _FALSE, _TRUE, _INTEGER, _STRING = range(5)
+
+
+def _pack_value(value):
+    value = _state_value(value)
+    if value is None:
+        return bytes((_NONE,))
+    if value is False:
+        return bytes((_FALSE,))
+    if value is True:
+        return bytes((_TRUE,))
+    if isinstance(value, int) and -(2**63) <= value < 2**63:
+        return bytes((_INTEGER,)) + _INT.pack(value)
+    encoded = str(value).encode()
+    return bytes((_STRING,)) + _SIZE.pack(len(encoded)) + encoded
+
+
+def _unpack_value(data, offset):
+    tag = data[offset]
+    offset += 1
+    if tag == _NONE:
+        return None, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _INTEGER:
+        return _INT.unpack_from(data, offset)[0], offset + _INT.size
+    (size,) = _SIZE.unpack_from(data, offset)
+    start = offset + _SIZE.size
+    end = start + size
+    return data[start:end].decode(), end
+
+
+def _encode_binary(record):
+    machine_id, transition, source, target, timestamp, outcome = record
+    body = b"".join(
+        (
+            _RECORD_HEADER.pack(timestamp, outcome),
+            _pack_value(machine_id),
+            _pack_value(transition),
+            _pack_value(source),
+            _pack_value(target),
+        )
+    )
+    return _LENGTH.pack(len(body)) + body
+
+
+def _read_binary(f):
+    while True:
+        header = f.read(_LENGTH.size)
+        if len(header) < _LENGTH.size:
+            return
+        (size,) = _LENGTH.unpack(header)
+        body = f.read(size)
+        if len(body) < size:
+            # torn write at the end of the journal
+            return
+        timestamp, outcome = _RECORD_HEADER.unpack_from(body)
+        offset = _RECORD_HEADER.size
+        machine_id, offset = _unpack_value(body, offset)
+        transition, offset = _unpack_value(body, offset)
+        source, offset = _unpack_value(body, offset)
+        target, offset = _unpack_value(body, offset)
+        yield JournalRecord(
+            machine_id, transition, source, target, timestamp, OUTCOMES[outcome]
+        )
@@ -0,0 +1,212 @@
+from bisect import bisect_left
+import http.server
+import os
+import socketserver
+import tempfile
+import threading
+
+from .exceptions import InvalidStartState, StaleTransition
+from .observers import TransitionObserver
+
+DEFAULT_BUCKETS = (
+    0.00001,
+    0.00005,
+    0.0001,
+    0.0005,
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+)
+
+# positions in a per-transition stats list; histogram bucket counts follow
+ATTEMPTS = 0
+SUCCESSES = 1
+INVALID_START_STATE = 2
+CONDITIONS_NOT_MET = 3
+ERRORS = 4
+ON_ERROR_FALLBACKS = 5
+STALE = 6
+DURATION_SUM = 7
+FIRST_BUCKET = 8
+
+
+class MetricsCollector(TransitionObserver):
+    """Counters and latency histograms per State Machine class and transition
+
+    Add it as an observer (`StateMachine.add_observer(collector)`) and
+    export with `to_prometheus`, `write_prometheus`, or `serve_prometheus`.
+
+    Each thread records into its own shard, so recording an event takes no
+    lock; shards are merged when metrics are exported. Latency is observed
+    for transitions whose transition function ran (on_end and on_error).
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, namespace="fsm"):
+        self.buckets = tuple(sorted(buckets))
+        self.namespace = namespace
+        self._local = threading.local()
+        self._shards = []
+        self._shards_lock = threading.Lock()
+
+    def _stats(self, event):
+        try:
+            shard = self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._shards_lock:
+                self._shards.append(shard)
+
+        key = (type(event.machine).__name__, event.details.name)
+        try:
+            return shard[key]
+        except KeyError:
+            stats = shard[key] = [0] * FIRST_BUCKET + [0] * (len(self.buckets) + 1)
+            stats[DURATION_SUM] = 0.0
+            return stats
+
+    def _observe(self, stats, duration):
+        stats[DURATION_SUM] += duration
+        stats[FIRST_BUCKET + bisect_left(self.buckets, duration)] += 1
+
+    def on_start(self, event):
+        self._stats(event)[ATTEMPTS] += 1
+
+    def on_end(self, event):
+        stats = self._stats(event)
+        stats[SUCCESSES] += 1
+        self._observe(stats, event.duration)
+
+    def on_reject(self, event):
+        if isinstance(event.error, InvalidStartState):
+            self._stats(event)[INVALID_START_STATE] += 1
+        elif isinstance(event.error, StaleTransition):
+            self._stats(event)[STALE] += 1
+        else:
+            self._stats(event)[CONDITIONS_NOT_MET] += 1
+
+    def on_error(self, event):
+        stats = self._stats(event)
+        stats[ERRORS] += 1
+        if event.details.on_error:
+            stats[ON_ERROR_FALLBACKS] += 1
+        self._observe(stats, event.duration)
+
+    def snapshot(self):
+        """Merge all shards: {(class name, transition name): stats list}"""
+        merged = {}
+        with self._shards_lock:
+            shards = list(self._shards)
+        for shard in shards:
+            for key, stats in list(shard.items()):
+                total = merged.setdefault(key, [0] * len(stats))
+                for i, value in enumerate(stats):
+                    total[i] += value
+        return merged
+
+    def reset(self):
+        with self._shards_lock:
+            for shard in self._shards:
+                shard.clear()
+
+    def to_prometheus(self):
+        """Metrics in the Prometheus text exposition format"""
+        prefix = f"{self.namespace}_transition"
+        snapshot = sorted(self.snapshot().items())
+        lines = []
+
+        def counter(name, help_text, index, extra_labels=""):
+            lines.append(f"# HELP {prefix}_{name} {help_text}")
+            lines.append(f"# TYPE {prefix}_{name} counter")
+            for key, stats in snapshot:
+                labels = _labels(key) + extra_labels
+                lines.append(f"{prefix}_{name}{{{labels}}} {stats[index]}")
+
+        counter("attempts_total", "Transitions called.", ATTEMPTS)
+        counter("successes_total", "Transitions completed.", SUCCESSES)
+        lines.append(f"# HELP {prefix}_rejections_total Transitions not allowed.")
+        lines.append(f"# TYPE {prefix}_rejections_total counter")
+        for reason, index in (
+            ("invalid_start_state", INVALID_START_STATE),
+            ("conditions_not_met", CONDITIONS_NOT_MET),
+            ("stale", STALE),
+        ):
+            for key, stats in snapshot:
+                labels = f'{_labels(key)},reason="{reason}"'
+                lines.append(f"{prefix}_rejections_total{{{labels}}} {stats[index]}")
+        counter("errors_total", "Transitions that raised an exception.", ERRORS)
+        counter(
+            "on_error_total",
+            "Transitions that moved to their on_error state.",
+            ON_ERROR_FALLBACKS,
+        )
+
+        name = f"{prefix}_duration_seconds"
+        lines.append(f"# HELP {name} Time spent running transitions.")
+        lines.append(f"# TYPE {name} histogram")
+        bucket_bounds = [repr(float(bound)) for bound in self.buckets] + ["+Inf"]
+        for key, stats in snapshot:
+            labels = _labels(key)
+            cumulative = 0
+            for i, bound in enumerate(bucket_bounds):
+                cumulative += stats[FIRST_BUCKET + i]
+                lines.append(f'{name}_bucket{{{labels},le="{bound}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{labels}}} {stats[DURATION_SUM]!r}")
+            lines.append(f"{name}_count{{{labels}}} {cumulative}")
+
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """Atomically write metrics to `path`, e.g. for the node_exporter
+        textfile collector"""
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".prom.tmp")
+        try:
+            with os.fdopen(fd, "w") as f:
+                f.write(self.to_prometheus())
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def serve_prometheus(self, port, addr="127.0.0.1"):
+        """Serve metrics over HTTP from a daemon thread; returns the server"""
+        server = _ThreadingHTTPServer((addr, port), self.http_handler())
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        return server
+
+    def http_handler(self):
+        """http.server request handler class that responds with the metrics"""
+        collector = self
+
+        class MetricsHandler(http.server.BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = collector.to_prometheus().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return MetricsHandler
+
+
+class _ThreadingHTTPServer(socketserver.ThreadingMixIn, http.server.HTTPServer):
+    daemon_threads = True
+
+
+def _labels(key):
+    machine, transition = key
+    return f'machine="{_escape(machine)}",transition="{_escape(transition)}"'
+
+
+def _escape(value):
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
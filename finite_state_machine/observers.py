@@ -0,0 +1,42 @@
+from typing import Any, NamedTuple, Optional
+
+
+class TransitionEvent(NamedTuple):
+    machine: Any
+    details: Any  # TransitionDetails of the transition being run
+    source: Any  # state of the machine when the transition was called
+    started_at: float  # time.perf_counter() when the transition was called
+    duration: float  # seconds since started_at; 0.0 for on_start
+    error: Optional[BaseException]
+
+    @property
+    def name(self):
+        return self.details.name
+
+    @property
+    def target(self):
+        return self.details.target
+
+
+class TransitionObserver:
+    """Base class for observers registered with `StateMachine.add_observer`
+
+    Every call of a transition sends `on_start` followed by one of:
+
+    - on_end: the transition function returned and the target state was set
+    - on_reject: InvalidStartState or ConditionsNotMet, in `event.error`
+    - on_error: a condition or the transition function raised `event.error`;
+      if the transition has an `on_error` state the machine is already in it
+    """
+
+    def on_start(self, event):
+        pass
+
+    def on_end(self, event):
+        pass
+
+    def on_reject(self, event):
+        pass
+
+    def on_error(self, event):
+        pass
@@ -0,0 +1,97 @@
+from array import array
+import sys
+
+
+class StateMachinePool:
+    """Track the state of many entities of one State Machine class
+
+    Each entity is a row in a contiguous array holding its state as an
+    integer code (see `StateMachine.encode_states`), so tracking an entity
+    costs one or two bytes instead of a full Python object.
+
+    Indexing the pool returns a lightweight view that runs the class's
+    `@transition` methods against the array. Views only carry state;
+    attributes set on a view are not stored in the pool.
+    """
+
+    def __init__(self, machine_class):
+        self.machine_class = machine_class
+        self._state_codes = machine_class._fsm_state_codes
+        typecode = "B" if len(machine_class._fsm_states) <= 256 else "H"
+        self.codes = array(typecode)
+        self._view_class = _make_view_class(machine_class)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, entity_id):
+        if not 0 <= entity_id < len(self.codes):
+            raise IndexError(f"{entity_id} is not in the pool")
+        view = object.__new__(self._view_class)
+        view._pool = self
+        view._entity_id = entity_id
+        return view
+
+    def __iter__(self):
+        for entity_id in range(len(self.codes)):
+            yield self[entity_id]
+
+    def add(self, state=None):
+        """Add an entity and return its id"""
+        self.codes.append(self._encode(self._initial(state)))
+        return len(self.codes) - 1
+
+    def extend(self, count, state=None):
+        """Add `count` entities in the same state; return range of their ids"""
+        start = len(self.codes)
+        code = self._encode(self._initial(state))
+        self.codes.extend(array(self.codes.typecode, [code]) * count)
+        return range(start, start + count)
+
+    def state_of(self, entity_id):
+        return self.machine_class._fsm_states[self.codes[entity_id]]
+
+    def memory_usage(self):
+        """Bytes used to store the state of every entity in the pool"""
+        return sys.getsizeof(self.codes)
+
+    def _initial(self, state):
+        if state is not None:
+            return state
+        try:
+            return self.machine_class.initial_state
+        except AttributeError:
+            raise ValueError(
+                f"Need a state: {self.machine_class.__name__} "
+                "does not define initial_state"
+            )
+
+    def _encode(self, state):
+        try:
+            return self._state_codes[state]
+        except KeyError:
+            raise ValueError(
+                f"{state!r} is not a state of {self.machine_class.__name__}"
+            )
+
+
+def _view_state(self):
+    pool = self._pool
+    return pool.machine_class._fsm_states[pool.codes[self._entity_id]]
+
+
+def _set_view_state(self, state):
+    pool = self._pool
+    pool.codes[self._entity_id] = pool._encode(state)
+
+
+def _make_view_class(machine_class):
+    return type(
+        f"{machine_class.__name__}View",
+        (machine_class,),
+        {
+            "__slots__": ("_pool", "_entity_id"),
+            "__module__": machine_class.__module__,
+            "state": property(_view_state, _set_view_state),
+        },
+    )
@@ -0,0 +1,244 @@
+import argparse
+import asyncio
+import cProfile
+import json
+import os
+import pstats
+import random
+import runpy
+import sys
+import threading
+import time
+import tracemalloc
+
+from finite_state_machine.draw_state_diagram import import_state_machine_class
+from finite_state_machine.observers import TransitionObserver
+
+COLUMNS = (
+    "transition",
+    "calls",
+    "ok",
+    "rejected",
+    "errors",
+    "cpu_seconds",
+    "function_seconds",
+    "allocated_bytes",
+)
+SORT_KEYS = ("cpu_seconds", "function_seconds", "allocated_bytes", "calls")
+
+
+class TransitionProfiler(TransitionObserver):
+    """Observer that measures CPU time and memory allocated per transition
+
+    CPU time (`time.process_time`) and allocations (tracemalloc's traced
+    memory, net of frees) include conditions and nested transitions.
+    """
+
+    def __init__(self):
+        self.stats = {}  # transition name -> [calls, ok, rejected, errors, cpu, bytes]
+        self._local = threading.local()
+
+    def _stack(self):
+        try:
+            return self._local.stack
+        except AttributeError:
+            stack = self._local.stack = []
+            return stack
+
+    def on_start(self, event):
+        self._stack().append((time.process_time(), _traced_memory()))
+
+    def _finish(self, event, outcome):
+        started_cpu, started_memory = self._stack().pop()
+        cpu = time.process_time() - started_cpu
+        allocated = _traced_memory() - started_memory
+
+        stats = self.stats.setdefault(event.name, [0, 0, 0, 0, 0.0, 0])
+        stats[0] += 1
+        stats[outcome] += 1
+        stats[4] += cpu
+        stats[5] += allocated
+
+    def on_end(self, event):
+        self._finish(event, 1)
+
+    def on_reject(self, event):
+        self._finish(event, 2)
+
+    def on_error(self, event):
+        self._finish(event, 3)
+
+
+def _traced_memory():
+    return tracemalloc.get_traced_memory()[0]
+
+
+def random_walk(cls, steps, initial_state=None, seed=None):
+    """Call `steps` random transitions available from the current state
+
+    Starts over with a new machine when no transition is available.
+    Transitions are called without arguments; rejections and errors are
+    counted by the observers and the walk carries on.
+    """
+    rng = random.Random(seed)
+    loop = None
+
+    def new_machine():
+        machine = cls()
+        if initial_state is not None:
+            machine.state = initial_state
+        if not machine.available_transitions():
+            raise ValueError(f"No transitions available from {machine.state}")
+        return machine
+
+    machine = new_machine()
+    try:
+        for _ in range(steps):
+            available = machine.available_transitions()
+            if not available:
+                machine = new_machine()
+                available = machine.available_transitions()
+
+            details = rng.choice(available)
+            try:
+                result = getattr(machine, details.name)()
+                if asyncio.iscoroutine(result):
+                    if loop is None:
+                        loop = asyncio.new_event_loop()
+                    loop.run_until_complete(result)
+            except Exception:
+                pass
+    finally:
+        if loop is not None:
+            loop.close()
+
+
+def profile_workload(cls, workload):
+    """Run `workload()` under cProfile and tracemalloc with `cls` observed
+
+    Returns a list of per-transition rows (dicts keyed by COLUMNS).
+    `function_seconds` is the cumulative time cProfile measured in the
+    transition function itself, without the transition's checks.
+    """
+    profiler = TransitionProfiler()
+    profile = cProfile.Profile()
+
+    cls.add_observer(profiler)
+    tracemalloc.start()
+    try:
+        profile.runcall(workload)
+    finally:
+        tracemalloc.stop()
+        cls.remove_observer(profiler)
+
+    function_seconds = {}
+    profile_stats = pstats.Stats(profile).stats
+    for attr, details in cls._fsm_transitions.items():
+        code = getattr(cls, attr).__wrapped__.__code__
+        key = (code.co_filename, code.co_firstlineno, code.co_name)
+        if key in profile_stats:
+            function_seconds[details.name] = profile_stats[key][3]
+
+    rows = []
+    for name, (calls, ok, rejected, errors, cpu, allocated) in profiler.stats.items():
+        rows.append(
+            {
+                "transition": name,
+                "calls": calls,
+                "ok": ok,
+                "rejected": rejected,
+                "errors": errors,
+                "cpu_seconds": cpu,
+                "function_seconds": function_seconds.get(name, 0.0),
+                "allocated_bytes": allocated,
+            }
+        )
+    return rows
+
+
+def format_table(rows):
+    header = list(COLUMNS)
+    lines = [header]
+    for row in rows:
+        line = []
+        for column in COLUMNS:
+            value = row[column]
+            line.append(f"{value:.6f}" if isinstance(value, float) else str(value))
+        lines.append(line)
+
+    widths = [max(len(line[i]) for line in lines) for i in range(len(header))]
+    return "\n".join(
+        "  ".join(
+            value.ljust(width) if i == 0 else value.rjust(width)
+            for i, (value, width) in enumerate(zip(line, widths))
+        )
+        for line in lines
+    )
+
+
+def parse_args(argv=None):
+    description = "Profile the transitions of a State Machine"
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument(
+        "--class",
+        type=str,
+        help="Path to State Machine class, e.g. importable.module:class",
+        required=True,
+    )
+    parser.add_argument(
+        "--workload",
+        type=str,
+        help="Python script to profile; runs with `state_machine_class` defined. "
+        "Without a workload, a random walk over the transitions is profiled",
+        required=False,
+    )
+    parser.add_argument(
+        "--steps",
+        type=int,
+        default=10_000,
+        help="Number of transitions in the random walk",
+    )
+    parser.add_argument(
+        "--initial_state",
+        type=str,
+        help="State to start the random walk from",
+        required=False,
+    )
+    parser.add_argument("--seed", type=int, help="Seed for the random walk")
+    parser.add_argument(
+        "--sort", choices=SORT_KEYS, default="cpu_seconds", help="Column to sort by"
+    )
+    parser.add_argument("--json", action="store_true", help="Output JSON")
+    return vars(parser.parse_args(argv))
+
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    sys.path.append(os.getcwd())
+    class_obj = import_state_machine_class(args["class"])
+
+    if args["workload"]:
+
+        def workload():
+            runpy.run_path(
+                args["workload"],
+                init_globals={"state_machine_class": class_obj},
+                run_name="__main__",
+            )
+
+    else:
+
+        def workload():
+            random_walk(class_obj, args["steps"], args["initial_state"], args["seed"])
+
+    rows = profile_workload(class_obj, workload)
+    rows.sort(key=lambda row: row[args["sort"]], reverse=True)
+    if args["json"]:
+        print(json.dumps(rows, indent=2))
+    else:
+        print(format_table(rows))
+
+
+if __name__ == "__main__":
+    main()
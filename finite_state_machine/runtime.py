@@ -0,0 +1,202 @@
+import asyncio
+from collections import deque
+from typing import NamedTuple
+
+
+class RuntimeStats(NamedTuple):
+    workers: int
+    busy_workers: int
+    mailboxes: int  # machines with queued or running events
+    ready: int  # mailboxes waiting for a worker
+    queued: int  # events not yet finished
+    max_queue_depth: int  # most events seen queued for a single machine
+    processed: int
+
+
+class _Mailbox:
+    __slots__ = ("machine", "messages")
+
+    def __init__(self, machine):
+        self.machine = machine
+        self.messages = deque()  # (event, args, kwargs, future)
+
+
+class ActorRuntime:
+    """Run events for many machines concurrently, one at a time per machine
+
+    Every machine gets a mailbox; a pool of `workers` tasks takes turns on
+    mailboxes with queued events, running up to `batch_size` events with
+    `asend` before moving the mailbox to the back of the line. A machine's
+    events never overlap, so an async transition can't be interleaved with
+    another transition on the same machine.
+
+    With `max_queued`, `tell` and `send` wait while that many events are
+    queued across all machines.
+
+        async with ActorRuntime(workers=8) as runtime:
+            result = await runtime.send(machine, "approve")
+    """
+
+    def __init__(self, workers=8, batch_size=8, max_queued=None):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if batch_size < 1:
+            raise ValueError("batch_size must be at least 1")
+        if max_queued is not None and max_queued < 1:
+            raise ValueError("max_queued must be at least 1")
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_queued = max_queued
+
+        self._mailboxes = {}  # id(machine) -> _Mailbox, while it has events
+        self._ready = None
+        self._slots = None
+        self._idle = None
+        self._tasks = []
+        self._busy = 0
+        self._queued = 0
+        self._max_queue_depth = 0
+        self._processed = 0
+
+    async def __aenter__(self):
+        self.start()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                await self.join()
+        finally:
+            await self.stop()
+
+    def start(self):
+        """Start the worker tasks; needs a running event loop"""
+        if self._tasks:
+            raise RuntimeError("ActorRuntime is already running")
+        self._ready = asyncio.Queue()
+        self._idle = asyncio.Event()
+        self._idle.set()
+        if self.max_queued is not None:
+            self._slots = asyncio.Semaphore(self.max_queued)
+        self._tasks = [
+            asyncio.ensure_future(self._worker()) for _ in range(self.workers)
+        ]
+
+    async def stop(self):
+        """Cancel the workers; events still queued are cancelled"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        for mailbox in self._mailboxes.values():
+            for _, _, _, future in mailbox.messages:
+                future.cancel()
+        self._mailboxes.clear()
+        self._queued = 0
+        if self._idle is not None:
+            self._idle.set()
+
+    async def join(self):
+        """Wait until every queued event has finished"""
+        await self._idle.wait()
+
+    async def tell(self, machine, event, *args, **kwargs):
+        """Queue `event` for `machine`; returns a future for the result of
+        `machine.asend(event, *args, **kwargs)`"""
+        if not self._tasks:
+            raise RuntimeError("ActorRuntime is not running")
+        if self._slots is not None:
+            await self._slots.acquire()
+
+        future = asyncio.get_event_loop().create_future()
+        mailbox = self._mailboxes.get(id(machine))
+        if mailbox is None:
+            mailbox = self._mailboxes[id(machine)] = _Mailbox(machine)
+            self._ready.put_nowait(mailbox)
+        mailbox.messages.append((event, args, kwargs, future))
+
+        self._queued += 1
+        self._idle.clear()
+        if len(mailbox.messages) > self._max_queue_depth:
+            self._max_queue_depth = len(mailbox.messages)
+        return future
+
+    async def send(self, machine, event, *args, **kwargs):
+        """Queue `event` for `machine` and wait for its result"""
+        return await (await self.tell(machine, event, *args, **kwargs))
+
+    def queue_depth(self, machine):
+        """Number of events queued for `machine`, including a running one"""
+        mailbox = self._mailboxes.get(id(machine))
+        return 0 if mailbox is None else len(mailbox.messages)
+
+    def stats(self):
+        return RuntimeStats(
+            workers=len(self._tasks),
+            busy_workers=self._busy,
+            mailboxes=len(self._mailboxes),
+            ready=0 if self._ready is None else self._ready.qsize(),
+            queued=self._queued,
+            max_queue_depth=self._max_queue_depth,
+            processed=self._processed,
+        )
+
+    async def _worker(self):
+        while True:
+            mailbox = await self._ready.get()
+            self._busy += 1
+            try:
+                await self._run(mailbox)
+            finally:
+                self._busy -= 1
+                # a mailbox stays in _mailboxes while it's queued or running,
+                # so tell() only queues it for a worker when it's created
+                if mailbox.messages:
+                    self._ready.put_nowait(mailbox)
+                else:
+                    self._mailboxes.pop(id(mailbox.machine), None)
+
+    async def _run(self, mailbox):
+        machine = mailbox.machine
+        messages = mailbox.messages
+        for _ in range(self.batch_size):
+            if not messages:
+                return
+            # the event stays at the front of the mailbox while it runs,
+            # so it counts towards queue_depth
+            event, args, kwargs, future = messages[0]
+            try:
+                if not future.cancelled():
+                    await self._send(machine, event, args, kwargs, future)
+            finally:
+                messages.popleft()
+                self._finished()
+
+    @staticmethod
+    async def _send(machine, event, args, kwargs, future):
+        # the event runs in its own task, so a transition raising
+        # CancelledError (e.g. awaiting a future cancelled elsewhere) can be
+        # told apart from the worker being cancelled
+        task = asyncio.ensure_future(machine.asend(event, *args, **kwargs))
+        try:
+            await asyncio.wait((task,))
+        except asyncio.CancelledError:
+            task.cancel()
+            future.cancel()
+            raise
+        if future.cancelled():
+            return
+        if task.cancelled():
+            future.cancel()
+        elif task.exception() is not None:
+            future.set_exception(task.exception())
+        else:
+            future.set_result(task.result())
+
+    def _finished(self):
+        self._processed += 1
+        self._queued -= 1
+        if self._slots is not None:
+            self._slots.release()
+        if not self._queued:
+            self._idle.set()
@@ -0,0 +1,230 @@
+from array import array
+import json
+import mmap
+import struct
+import sys
+
+from .pool import StateMachinePool
+from .state_machine import _state_value
+
+MAGIC = b"FSMSNAP\x01"
+_HEADER_SIZE = struct.Struct("<I")
+# columns start at multiples of 8 bytes, so they can be cast in place
+_ALIGNMENT = 8
+
+
+def save_snapshot(path, machines, attributes=()):
+    """Write machines of one State Machine class to a columnar snapshot
+
+    `machines` is a sequence of machines or a StateMachinePool. States are
+    stored as integer codes (see `StateMachine.encode_states`) under a
+    header listing the class's states; each of `attributes` is stored as
+    a column of 64-bit ints or floats when all values are, else as JSON.
+    """
+    if isinstance(machines, StateMachinePool):
+        machine_class = machines.machine_class
+        codes = machines.codes
+        if attributes:
+            raise ValueError("Pool entities don't have attributes")
+    else:
+        machines = list(machines)
+        if not machines:
+            raise ValueError("Need at least one machine")
+        machine_class = type(machines[0])
+        codes = machine_class.encode_states(machine.state for machine in machines)
+
+    sections = [codes.tobytes()]
+    columns = []
+    for name in attributes:
+        values = [getattr(machine, name) for machine in machines]
+        typecode = _column_typecode(values)
+        if typecode == "json":
+            data = json.dumps(values, separators=(",", ":")).encode()
+        else:
+            data = array(typecode, values).tobytes()
+        columns.append({"name": name, "typecode": typecode, "size": len(data)})
+        sections.append(data)
+
+    header = {
+        "class": machine_class.__name__,
+        "states": [_state_value(state) for state in machine_class._fsm_states],
+        "count": len(codes),
+        "typecode": codes.typecode,
+        "byteorder": sys.byteorder,
+        "columns": columns,
+    }
+    header_bytes = json.dumps(header, separators=(",", ":")).encode()
+
+    with open(path, "wb") as f:
+        f.write(MAGIC)
+        f.write(_HEADER_SIZE.pack(len(header_bytes)))
+        f.write(header_bytes)
+        for data in sections:
+            f.write(b"\0" * (-f.tell() % _ALIGNMENT))
+            f.write(data)
+
+
+class Snapshot:
+    """Machines in a snapshot file, restored on access
+
+    The file is memory-mapped: opening it only reads the header, state
+    codes and numeric columns are read in place, and a machine is only
+    created, without calling `__init__`, when it is indexed.
+
+        with Snapshot(path, GitHubPullRequest) as snapshot:
+            pr = snapshot[42]
+            pool = snapshot.to_pool()
+    """
+
+    def __init__(self, path, machine_class):
+        self.machine_class = machine_class
+        with open(path, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = memoryview(self._mmap)
+        self._sections = []
+        self._columns = {}
+        try:
+            self._read_header()
+        except BaseException:
+            self.close()
+            raise
+
+    def _read_header(self):
+        view = self._view
+        if view[: len(MAGIC)] != MAGIC:
+            raise ValueError("Not a State Machine snapshot")
+        offset = len(MAGIC)
+        (size,) = _HEADER_SIZE.unpack_from(view, offset)
+        offset += _HEADER_SIZE.size
+        end = offset + size
+        header = json.loads(bytes(view[offset:end]))
+        offset = end
+
+        self.header = header
+        self.attributes = tuple(column["name"] for column in header["columns"])
+        self._swap = header["byteorder"] != sys.byteorder
+        self._translation = self._state_translation(header["states"])
+
+        sections = [(header["typecode"], header["count"] * _itemsize(header))]
+        sections += [
+            (column["typecode"], column["size"]) for column in header["columns"]
+        ]
+        for typecode, size in sections:
+            offset += -offset % _ALIGNMENT
+            end = offset + size
+            self._sections.append((typecode, view[offset:end]))
+            offset = end
+
+    def _state_translation(self, snapshot_states):
+        """Map codes in the file to the class's codes; None if they match"""
+        machine_class = self.machine_class
+        states = {_state_value(state): state for state in machine_class._fsm_states}
+        try:
+            translation = [
+                machine_class._fsm_state_codes[states[state]]
+                for state in snapshot_states
+            ]
+        except KeyError as e:
+            raise ValueError(
+                f"{e.args[0]!r} is not a state of {machine_class.__name__}"
+            )
+        if translation == list(range(len(translation))):
+            return None
+        return translation
+
+    def __len__(self):
+        return self.header["count"]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Unmap the file; views returned by `codes` and `column` must not
+        be used anymore"""
+        for values in self._columns.values():
+            if isinstance(values, memoryview):
+                values.release()
+        for _, data in self._sections:
+            data.release()
+        self._columns = {}
+        self._sections = []
+        self._view.release()
+        self._mmap.close()
+
+    @property
+    def codes(self):
+        """State codes in the class's encoding; a view of the file unless
+        they had to be translated"""
+        return self.column(None)
+
+    def column(self, name):
+        """Values of attribute `name` for every machine, in order"""
+        try:
+            return self._columns[name]
+        except KeyError:
+            pass
+        if name is None:
+            typecode, data = self._sections[0]
+        elif name in self.attributes:
+            typecode, data = self._sections[1 + self.attributes.index(name)]
+        else:
+            raise KeyError(name)
+
+        if typecode == "json":
+            values = json.loads(bytes(data))
+        elif self._swap or (name is None and self._translation is not None):
+            values = array(typecode)
+            values.frombytes(data)
+            if self._swap:
+                values.byteswap()
+            if name is None and self._translation is not None:
+                translation = self._translation
+                values = array(
+                    self.machine_class.encode_states(()).typecode,
+                    [translation[code] for code in values],
+                )
+        else:
+            values = data.cast(typecode)
+        self._columns[name] = values
+        return values
+
+    def state_of(self, index):
+        return self.machine_class._fsm_states[self.codes[index]]
+
+    def __getitem__(self, index):
+        if not -len(self) <= index < len(self):
+            raise IndexError(f"{index} is not in the snapshot")
+        machine = self.machine_class.__new__(self.machine_class)
+        machine.state = self.state_of(index)
+        for name in self.attributes:
+            setattr(machine, name, self.column(name)[index])
+        return machine
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_pool(self):
+        """StateMachinePool holding every state in the snapshot"""
+        pool = StateMachinePool(self.machine_class)
+        codes = self.codes
+        if codes.itemsize != pool.codes.itemsize:
+            codes = array(pool.codes.typecode, codes)
+        pool.codes.frombytes(codes)
+        return pool
+
+
+def _column_typecode(values):
+    if all(type(value) is int for value in values):
+        if all(-(2**63) <= value < 2**63 for value in values):
+            return "q"
+    elif all(type(value) is float for value in values):
+        return "d"
+    return "json"
+
+
+def _itemsize(header):
+    return array(header["typecode"]).itemsize
@@ -1,19 +1,537 @@
+from array import array
 import asyncio
 from enum import Enum
 import functools
+import inspect
+import threading
+import time
 import types
-from typing import NamedTuple, Union
+from typing import Any, NamedTuple, Optional, Union
 
-from .exceptions import ConditionsNotMet, InvalidStartState
+from . import conditions as _conditions
+from .exceptions import (
+    ConditionsNotMet,
+    InvalidStartState,
+    StaleTransition,
+    TransitionNotAllowed,
+    TransitionTimeout,
+)
+from .observers import TransitionEvent
 
 
 class StateMachine:
+    # subclasses can declare __slots__ = ("state", ...) to drop __dict__
+    __slots__ = ()
+
+    # per-class lookup tables, compiled once in __init_subclass__
+    #   _fsm_transitions: attribute name -> TransitionDetails
+    #   _fsm_table: (source state, transition name) -> TransitionDetails
+    #   _fsm_available: source state -> tuple of TransitionDetails
+    #   _fsm_states / _fsm_state_codes: integer encoding of every known state
+    #   _fsm_events: (source state, event) -> entry used by send, see _event_entry
+    #   _fsm_event_sources: event -> source states, for error messages
+    _fsm_transitions = types.MappingProxyType({})
+    _fsm_table = types.MappingProxyType({})
+    _fsm_available = types.MappingProxyType({})
+    _fsm_states = ()
+    _fsm_state_codes = types.MappingProxyType({})
+    _fsm_events = types.MappingProxyType({})
+    _fsm_event_sources = types.MappingProxyType({})
+    _fsm_check_state = True
+    _fsm_state_slot_missing = False
+    # observers added to this class and its bases, see add_observer
+    _fsm_observers = ()
+    # whether an observer asks for spans around conditions, see tracing.py
+    _fsm_traced = False
+    # thread_safe class option: False, True (lock), or "optimistic"
+    _fsm_thread_safe = False
+    # transitions take the observed path (observers or thread safety)
+    _fsm_slow_path = False
+    # executor option, used by arun; None is the event loop's default
+    _fsm_executor = None
+    # track_changes option: id(machine) -> (machine, state at checkpoint)
+    _fsm_changes = None
+
+    def __init_subclass__(
+        cls, thread_safe=None, executor=None, track_changes=None, **kwargs
+    ):
+        super().__init_subclass__(**kwargs)
+        if executor is not None:
+            cls._fsm_executor = executor
+
+        if track_changes is False and cls._fsm_changes is not None:
+            raise ValueError("track_changes can't be turned off in a subclass")
+        if track_changes and cls._fsm_changes is None:
+            cls._fsm_changes = {}
+            cls.state = _TrackedState(cls, cls._fsm_changes)
+        elif cls._fsm_changes is not None and "state" in vars(cls):
+            # a subclass redeclaring state (e.g. in __slots__) would hide
+            # the inherited descriptor, so its own state is wrapped too
+            if not isinstance(vars(cls)["state"], _TrackedState):
+                cls.state = _TrackedState(cls, cls._fsm_changes)
+
+        # True: sync transitions hold a lock for the machine while they run
+        # "optimistic": the state is only set if it hasn't changed meanwhile
+        if thread_safe is not None:
+            if thread_safe not in (False, True, "optimistic"):
+                raise ValueError('thread_safe must be a bool or "optimistic"')
+            cls._fsm_thread_safe = thread_safe
+
+        # slotted classes declare state up front, so it's validated here
+        # once instead of every time a machine is created. The error is
+        # raised when the class is instantiated, as slotted bases can leave
+        # the state slot to their subclasses
+        has_dict = any("__dict__" in vars(klass) for klass in cls.__mro__)
+        cls._fsm_check_state = has_dict
+        cls._fsm_state_slot_missing = not has_dict and not hasattr(cls, "state")
+
+        transitions = {}
+        functions = {}
+        for klass in reversed(cls.__mro__):
+            for name, attr in vars(klass).items():
+                if inspect.isfunction(attr) and hasattr(attr, "_fsm"):
+                    transitions[name] = attr._fsm
+                    functions[name] = attr
+                    if klass is cls and not hasattr(attr, "_fsm_owner"):
+                        # class that defined the transition, used by bulk
+                        # transitions to decode integer states
+                        attr._fsm_owner = cls
+                else:
+                    # attribute overridden by a regular method / value
+                    transitions.pop(name, None)
+                    functions.pop(name, None)
+
+        table = {}
+        for details in transitions.values():
+            for state in details.source:
+                table[(state, details.name)] = details
+
+        available = {}
+        for (state, _), details in table.items():
+            available.setdefault(state, []).append(details)
+
+        # transitions sharing an event are tried in priority order, then in
+        # the order they were declared
+        events = {}
+        event_sources = {}
+        by_priority = sorted(transitions, key=lambda name: -transitions[name].priority)
+        for name in by_priority:
+            details = transitions[name]
+            for state in details.source:
+                events.setdefault((state, details.event), []).append(functions[name])
+                event_sources.setdefault(details.event, [])
+                if state not in event_sources[details.event]:
+                    event_sources[details.event].append(state)
+
+        # extend the inherited encoding so codes stay valid in subclasses
+        codes = {state: code for code, state in enumerate(cls._fsm_states)}
+        for details in transitions.values():
+            states = [*details.source, details.target]
+            if details.on_error:
+                states.append(details.on_error)
+            for state in states:
+                codes.setdefault(state, len(codes))
+
+        cls._fsm_transitions = types.MappingProxyType(transitions)
+        cls._fsm_table = types.MappingProxyType(table)
+        cls._fsm_available = types.MappingProxyType(
+            {state: tuple(details) for state, details in available.items()}
+        )
+        cls._fsm_states = tuple(codes)
+        cls._fsm_state_codes = types.MappingProxyType(codes)
+        cls._fsm_events = types.MappingProxyType(
+            {key: _event_entry(functions) for key, functions in events.items()}
+        )
+        cls._fsm_event_sources = types.MappingProxyType(event_sources)
+        _set_observers(cls)
+
     def __init__(self):
+        if not self._fsm_check_state:
+            if self._fsm_state_slot_missing:
+                raise ValueError("Need to declare state in __slots__")
+            return
         try:
             self.state
         except AttributeError:
             raise ValueError("Need to set a state instance variable")
 
+    def send(self, event, *args, **kwargs):
+        """Run the transition for `event` that is allowed from the current state
+
+        Transitions sharing an event are tried in order of priority; the
+        first one whose conditions are met runs and its result is returned.
+        Raises InvalidStartState if no transition for `event` starts from
+        the current state, or ConditionsNotMet listing the conditions of
+        every transition tried.
+        """
+        entry = self._fsm_events.get((self.state, event))
+        if entry is None:
+            raise self._event_not_allowed(event)
+        is_async, func, target, dispatch, functions = entry
+        if is_async:
+            raise TypeError(f"{event} has async transitions; use `asend` instead")
+
+        if func is not None and not self._fsm_slow_path:
+            result = func(self, *args, **kwargs)
+            self.state = target
+            return result
+        if dispatch is not None:
+            return dispatch((self, *args), kwargs)
+
+        conditions_not_met = []
+        for function in functions:
+            outcome = function.try_(self, *args, **kwargs)
+            if outcome.ok:
+                return outcome.result
+            if not isinstance(outcome.error, ConditionsNotMet):
+                # the state changed while an earlier transition was tried
+                raise outcome.error
+            conditions_not_met.extend(outcome.error.conditions)
+        raise ConditionsNotMet(conditions_not_met)
+
+    async def asend(self, event, *args, **kwargs):
+        """Version of `send` for events with async (or sync) transitions"""
+        entry = self._fsm_events.get((self.state, event))
+        if entry is None:
+            raise self._event_not_allowed(event)
+        is_async, func, target, dispatch, functions = entry
+
+        if dispatch is not None:
+            result = dispatch((self, *args), kwargs)
+            return await result if is_async else result
+
+        conditions_not_met = []
+        for function in functions:
+            outcome = function.try_(self, *args, **kwargs)
+            if inspect.isawaitable(outcome):
+                outcome = await outcome
+            if outcome.ok:
+                return outcome.result
+            if not isinstance(outcome.error, ConditionsNotMet):
+                # the state changed while an earlier transition was tried
+                raise outcome.error
+            conditions_not_met.extend(outcome.error.conditions)
+        raise ConditionsNotMet(conditions_not_met)
+
+    async def arun(self, name, *args, **kwargs):
+        """Run the transition `name` from async code without blocking the loop
+
+        Checks run on the event loop and the function of a sync transition
+        runs in the class's executor (`executor` class option, by default
+        the loop's default executor); async transitions are awaited as is.
+        Raises StaleTransition if the state changed while the function ran.
+        """
+        if name not in self._fsm_transitions:
+            raise ValueError(f"{type(self).__name__} has no transition {name}")
+        wrapper = getattr(type(self), name)
+        if asyncio.iscoroutinefunction(wrapper):
+            return await wrapper(self, *args, **kwargs)
+        return await wrapper.arun(self, *args, **kwargs)
+
+    def _event_not_allowed(self, event):
+        sources = self._fsm_event_sources.get(event)
+        if sources is None:
+            return ValueError(f"{type(self).__name__} has no transitions for {event}")
+        return InvalidStartState(self.state, event, sources)
+
+    def available_transitions(self, *args, check_conditions=False, **kwargs):
+        """Transitions that can run from the current state
+
+        Returns a tuple of TransitionDetails. With `check_conditions`, only
+        transitions whose conditions return True for the given arguments
+        are included; async conditions need to be checked with `can`.
+        """
+        available = self._fsm_available.get(self.state, ())
+        if not check_conditions:
+            return available
+
+        allowed = []
+        for details in available:
+            for condition in details.conditions:
+                if asyncio.iscoroutinefunction(condition):
+                    raise TypeError(
+                        f"{details.name} has async conditions; use `can` instead"
+                    )
+                if condition(self, *args, **kwargs) is not True:
+                    break
+            else:
+                allowed.append(details)
+        return tuple(allowed)
+
+    @classmethod
+    def add_observer(cls, observer):
+        """Send events for transitions of this class and its subclasses to
+        a TransitionObserver; add to StateMachine to observe every class
+
+        Classes without observers skip event handling entirely.
+        """
+        cls._fsm_own_observers = (*vars(cls).get("_fsm_own_observers", ()), observer)
+        _refresh_observers(cls)
+
+    @classmethod
+    def remove_observer(cls, observer):
+        own_observers = list(vars(cls).get("_fsm_own_observers", ()))
+        own_observers.remove(observer)
+        cls._fsm_own_observers = tuple(own_observers)
+        _refresh_observers(cls)
+
+    def compare_and_set_state(self, expected, state):
+        """Set the state to `state` if it is `expected`, atomically with
+        respect to other threads; returns whether the state was set"""
+        lock = _state_lock(self)
+        with lock:
+            _wait_for_machine(lock, self)
+            if self.state != expected:
+                return False
+            self.state = state
+            return True
+
+    @classmethod
+    def changed_machines(cls):
+        """Machines whose state changed since their last checkpoint; needs
+        the track_changes class option"""
+        return [machine for machine, _ in cls._changes()]
+
+    @classmethod
+    def changeset(cls):
+        """(machine, state at checkpoint, current state) for every changed
+        machine"""
+        return [(machine, state, machine.state) for machine, state in cls._changes()]
+
+    @classmethod
+    def checkpoint(cls, machines=None):
+        """Mark `machines` (default: all changed machines) as unchanged"""
+        changes = cls._changes_registry()
+        if machines is None:
+            machines = cls.changed_machines()
+        for machine in machines:
+            changes.pop(id(machine), None)
+
+    @classmethod
+    def _changes_registry(cls):
+        if cls._fsm_changes is None:
+            raise ValueError(f"{cls.__name__} does not track changes")
+        return cls._fsm_changes
+
+    @classmethod
+    def _changes(cls):
+        return [
+            (machine, state)
+            for machine, state in list(cls._changes_registry().values())
+            if isinstance(machine, cls)
+        ]
+
+    @classmethod
+    def encode_states(cls, states):
+        """Encode states as a compact array of integer codes
+
+        Used to build the state column for bulk transitions.
+        """
+        typecode = "B" if len(cls._fsm_states) <= 256 else "H"
+        try:
+            return array(typecode, [cls._fsm_state_codes[state] for state in states])
+        except KeyError as e:
+            raise ValueError(f"{e.args[0]!r} is not a state of {cls.__name__}")
+
+    @classmethod
+    def decode_states(cls, codes):
+        """Decode an array of integer codes back into states"""
+        return [cls._fsm_states[code] for code in codes]
+
+
+class _TrackedState:
+    """`state` descriptor for the track_changes class option
+
+    Wraps the class's own state descriptor (a slot or property), if any,
+    and records the state a machine had at its last checkpoint when the
+    state changes. Changing back to that state clears the record; the
+    first assignment, usually in __init__, isn't a change. A class-level
+    default (`state = "new"`) is the state of machines that don't set one.
+    """
+
+    _no_default = object()
+
+    def __init__(self, cls, changes):
+        inner = inspect.getattr_static(cls, "state", self._no_default)
+        self.inner = None
+        self.default = self._no_default
+        if hasattr(type(inner), "__set__"):
+            self.inner = inner
+        else:
+            self.default = inner
+        self.changes = changes
+
+    def __get__(self, machine, owner=None):
+        if machine is None:
+            return self
+        if self.inner is not None:
+            return self.inner.__get__(machine, owner)
+        try:
+            return machine.__dict__["state"]
+        except KeyError:
+            if self.default is self._no_default:
+                raise AttributeError("state") from None
+            return self.default
+
+    def __set__(self, machine, state):
+        try:
+            old_state = self.__get__(machine)
+        except AttributeError:
+            pass
+        else:
+            changes = self.changes
+            key = id(machine)
+            if key not in changes:
+                if old_state != state:
+                    changes[key] = (machine, old_state)
+            elif changes[key][1] == state:
+                del changes[key]
+
+        if self.inner is not None:
+            self.inner.__set__(machine, state)
+        else:
+            machine.__dict__["state"] = state
+
+
+def _state_value(state):
+    """Enum states as their value, for storage formats"""
+    return state.value if isinstance(state, Enum) else state
+
+
+def _set_observers(cls):
+    cls._fsm_observers = tuple(
+        observer
+        for klass in reversed(cls.__mro__)
+        for observer in vars(klass).get("_fsm_own_observers", ())
+    )
+    cls._fsm_traced = any(
+        getattr(observer, "traces_calls", False) for observer in cls._fsm_observers
+    )
+    cls._fsm_slow_path = bool(cls._fsm_observers or cls._fsm_thread_safe)
+
+
+# striped locks for thread-safe classes, so machines don't need to store a
+# lock and unrelated machines rarely share one. They are only held for
+# short state checks, never while conditions or transition functions run:
+# a sync transition of a thread_safe=True class claims its machine instead
+_STATE_LOCKS = tuple(threading.Condition(threading.RLock()) for _ in range(1024))
+# id(machine) -> [thread ident, depth] for machines running such a transition
+_CLAIMS = {}
+
+
+def _state_lock(state_machine):
+    # objects are 16-byte aligned, drop the bits that are always zero
+    return _STATE_LOCKS[(id(state_machine) >> 4) % len(_STATE_LOCKS)]
+
+
+def _wait_for_machine(lock, state_machine):
+    """Wait, holding `lock`, until no other thread has claimed the machine;
+    returns the claim of the current thread, if any"""
+    key = id(state_machine)
+    thread = threading.get_ident()
+    while True:
+        claim = _CLAIMS.get(key)
+        if claim is None or claim[0] == thread:
+            return claim
+        lock.wait()
+
+
+def _claim(state_machine):
+    """Mark the machine as running a transition in the current thread;
+    other threads' transitions on it wait until `_release`"""
+    lock = _state_lock(state_machine)
+    with lock:
+        claim = _wait_for_machine(lock, state_machine)
+        if claim is None:
+            _CLAIMS[id(state_machine)] = [threading.get_ident(), 1]
+        else:
+            claim[1] += 1
+
+
+def _release(state_machine):
+    lock = _state_lock(state_machine)
+    with lock:
+        claim = _CLAIMS[id(state_machine)]
+        claim[1] -= 1
+        if not claim[1]:
+            del _CLAIMS[id(state_machine)]
+            lock.notify_all()
+
+
+def _set_state(state_machine, start_state, state, name, optimistic):
+    if not optimistic:
+        state_machine.state = state
+        return
+    lock = _state_lock(state_machine)
+    with lock:
+        _wait_for_machine(lock, state_machine)
+        if state_machine.state != start_state:
+            raise StaleTransition(state_machine.state, name, start_state)
+        state_machine.state = state
+
+
+# task running a transition with a timeout -> [machine, transition name,
+# TransitionTimeout once it expired]; see transition._deadline
+_DEADLINES = {}
+_current_task = getattr(asyncio, "current_task", None) or asyncio.Task.current_task
+
+
+def _claim_deadline(state_machine, name):
+    """Deadline of transition `name` running in this task, if it has one
+
+    The observed path claims it, so the timeout is reported to observers
+    in the context their `on_start` ran in; transitions it calls don't see
+    the deadline anymore.
+    """
+    if not _DEADLINES:
+        return None
+    task = _current_task()
+    deadline = _DEADLINES.get(task)
+    if deadline is None or deadline[0] is not state_machine or deadline[1] != name:
+        return None
+    del _DEADLINES[task]
+    return deadline
+
+
+def _until_deadline(function, deadline):
+    """`function` raising TransitionTimeout instead of CancelledError when
+    it is cancelled because its deadline expired"""
+
+    async def bounded(*args, **kwargs):
+        try:
+            return await function(*args, **kwargs)
+        except asyncio.CancelledError:
+            if deadline[2] is None:
+                raise
+            raise deadline[2] from None
+
+    return bounded
+
+
+def _refresh_observers(cls):
+    _set_observers(cls)
+    for subclass in cls.__subclasses__():
+        _refresh_observers(subclass)
+
+
+def _event_entry(functions):
+    """(is async, function, target, dispatch, functions) for StateMachine.send
+
+    A single transition is run by its dispatch function, or inline by send
+    when it has no conditions or on_error state (then `function` is set);
+    several transitions sharing an event are tried in the given order.
+    """
+    is_async = any(map(asyncio.iscoroutinefunction, functions))
+    if len(functions) > 1:
+        return (is_async, None, None, None, tuple(functions))
+
+    wrapper = functions[0]
+    details = wrapper._fsm
+    func = None
+    if not details.conditions and not details.on_error:
+        func = wrapper.__wrapped__
+    return (is_async, func, details.target, wrapper._fsm_dispatch, (wrapper,))
+
 
 class TransitionDetails(NamedTuple):
     name: str
@@ -21,10 +539,42 @@ class TransitionDetails(NamedTuple):
     target: Union[bool, int, str]
     conditions: list
     on_error: Union[bool, int, str]
+    event: str = None  # name used with `StateMachine.send`
+    priority: int = 0  # transitions sharing an event are tried highest first
+
+
+class TransitionResult(NamedTuple):
+    """Outcome of `try_`
+
+    `ok` is False when the transition was not allowed; `error` holds the
+    reason as an unraised TransitionNotAllowed exception.
+    """
+
+    ok: bool
+    result: Any
+    error: Optional[TransitionNotAllowed]
+
+    def __bool__(self):
+        return self.ok
+
+
+# skips the Python-level NamedTuple.__new__ on the rejection path
+_transition_result = functools.partial(tuple.__new__, TransitionResult)
 
 
 class transition:
-    def __init__(self, source, target, conditions=None, on_error=None):
+    def __init__(
+        self,
+        source,
+        target,
+        conditions=None,
+        on_error=None,
+        conditions_mode="all",
+        concurrent_conditions=False,
+        event=None,
+        priority=0,
+        timeout=None,
+    ):
         allowed_types = (str, bool, int, Enum)
 
         if isinstance(source, allowed_types):
@@ -54,6 +604,36 @@ class transition:
                 raise ValueError("on_error needs to be a bool, int or string")
         self.on_error = on_error
 
+        # all: evaluate every condition, ConditionsNotMet lists all failures
+        # fail_fast: stop at the first condition that does not return True
+        # adaptive: fail_fast, reordering conditions by cost per rejection
+        if conditions_mode not in _conditions.CONDITIONS_MODES:
+            raise ValueError(
+                f"conditions_mode must be one of {_conditions.CONDITIONS_MODES}"
+            )
+        self.conditions_mode = conditions_mode
+
+        # run async conditions at the same time (async transitions only)
+        if concurrent_conditions and conditions_mode == "adaptive":
+            raise ValueError("adaptive conditions_mode cannot run concurrently")
+        self.concurrent_conditions = concurrent_conditions
+
+        # `send(event)` dispatches to this transition; defaults to its name
+        if event is not None and not isinstance(event, str):
+            raise ValueError("event must be a string")
+        self.event = event
+        if not isinstance(priority, int) or isinstance(priority, bool):
+            raise ValueError("priority must be an integer")
+        self.priority = priority
+
+        # seconds for conditions and function together (async transitions only)
+        if timeout is not None:
+            if isinstance(timeout, bool) or not isinstance(timeout, (int, float)):
+                raise ValueError("timeout must be a number of seconds")
+            if timeout <= 0:
+                raise ValueError("timeout must be positive")
+        self.timeout = timeout
+
     def __call__(self, func):
         func._fsm = TransitionDetails(
             func.__name__,
@@ -61,87 +641,558 @@ class transition:
             self.target,
             self.conditions,
             self.on_error,
+            func.__name__ if self.event is None else self.event,
+            self.priority,
         )
 
-        @functools.wraps(func)
-        def sync_callable(*args, **kwargs):
-            try:
-                state_machine, rest = args
-            except ValueError:
-                state_machine = args[0]
-
-            if state_machine.state not in self.source:
-                exception_message = (
-                    f"Current state is {state_machine.state}. "
-                    f"{func.__name__} allows transitions from {self.source}."
-                )
-                raise InvalidStartState(exception_message)
+        # wrappers are specialized when the transition is decorated so the
+        # per-call path only contains the steps this transition needs
+        if asyncio.iscoroutinefunction(func):
+            check_conditions = _conditions.async_checker(
+                self.conditions, self.conditions_mode, self.concurrent_conditions
+            )
+            observed = self._async_observed(
+                func, check_conditions, self._traced_calls(func)
+            )
+            if self.conditions or self.on_error:
+                wrapper = self._async_callable(observed)
+            else:
+                wrapper = self._async_fast_path(func, observed)
+            can, try_ = self._async_checks(func, observed)
+            dispatch = observed
+            if self.timeout is not None:
+                wrapper, try_, dispatch = self._deadline(func, wrapper, try_, dispatch)
+        else:
+            if self.concurrent_conditions:
+                raise ValueError("concurrent_conditions requires an async transition")
+            if self.timeout is not None:
+                raise ValueError("timeout requires an async transition")
+            check_conditions = _conditions.sync_checker(
+                self.conditions, self.conditions_mode
+            )
+            observed = self._sync_observed(
+                func, check_conditions, self._traced_calls(func)
+            )
+            if self.conditions or self.on_error:
+                wrapper = self._sync_callable(observed)
+            else:
+                wrapper = self._sync_fast_path(func, observed)
+            can, try_ = self._sync_checks(func, observed)
+            dispatch = observed
 
-            conditions_not_met = []
-            for condition in self.conditions:
-                if condition(*args, **kwargs) is not True:
-                    conditions_not_met.append(condition)
-            if conditions_not_met:
-                raise ConditionsNotMet(conditions_not_met)
+        wrapper = functools.wraps(func)(wrapper)
+        wrapper.can = can
+        wrapper.try_ = try_
+        wrapper.bulk = self._bulk(wrapper)
+        if not asyncio.iscoroutinefunction(func):
+            wrapper.arun = self._arun(func)
+        wrapper._fsm_dispatch = dispatch
+        return wrapper
+
+    def _deadline(self, func, wrapper, try_, dispatch):
+        """Versions of the async entry points that time out after `timeout`
 
-            if not self.on_error:
-                result = func(*args, **kwargs)
-                state_machine.state = self.target
-                return result
+        On expiry the transition is cancelled, observers get `on_error`
+        with TransitionTimeout, and the machine moves to its on_error state
+        or TransitionTimeout is raised.
+        """
+        name = func.__name__
+        timeout = self.timeout
+        on_error = self.on_error
 
+        async def run(coroutine, state_machine, on_error_result):
+            start_state = state_machine.state
+            task = asyncio.ensure_future(coroutine)
+            deadline = [state_machine, name, None]
+            _DEADLINES[task] = deadline
             try:
-                result = func(*args, **kwargs)
-                state_machine.state = self.target
-                return result
-            except Exception:
-                # TODO should we log this somewhere?
-                # logger.error? maybe have an optional parameter to set this up
-                # how to libraries log?
-                state_machine.state = self.on_error
-                return
+                try:
+                    done, _ = await asyncio.wait((task,), timeout=timeout)
+                except asyncio.CancelledError:
+                    task.cancel()
+                    raise
+                if done:
+                    return task.result()
+
+                deadline[2] = TransitionTimeout(name, timeout)
+                task.cancel()
+                await asyncio.wait((task,))
+            finally:
+                _DEADLINES.pop(task, None)
+            if not task.cancelled() and task.exception() is None:
+                # finished while being cancelled, or the observed path
+                # reported the timeout and moved to the on_error state
+                return task.result()
+
+            # observers already got the timeout from the observed path
+            optimistic = bool(type(state_machine)._fsm_thread_safe)
+            if on_error:
+                _set_state(state_machine, start_state, on_error, name, optimistic)
+                return on_error_result
+            raise deadline[2]
+
+        async def bounded_wrapper(*args, **kwargs):
+            return await run(wrapper(*args, **kwargs), args[0], None)
+
+        async def bounded_try(*args, **kwargs):
+            result = _transition_result((True, None, None))
+            return await run(try_(*args, **kwargs), args[0], result)
+
+        async def bounded_dispatch(args, kwargs):
+            return await run(dispatch(args, kwargs), args[0], None)
+
+        return bounded_wrapper, bounded_try, bounded_dispatch
+
+    def _arun(self, func):
+        """Coroutine running the transition function in an executor
+
+        The source state and conditions are checked on the event loop; the
+        target state is set back on the loop with a compare-and-set, as
+        other coroutines can run while the function does. Built on first
+        use, as most sync transitions are never offloaded.
+        """
+        built = []
 
         @functools.wraps(func)
-        async def async_callable(*args, **kwargs):
-            try:
-                state_machine, rest = args
-            except ValueError:
-                state_machine = args[0]
-
-            if state_machine.state not in self.source:
-                exception_message = (
-                    f"Current state is {state_machine.state}. "
-                    f"{func.__name__} allows transitions from {self.source}."
+        async def offloaded(*args, **kwargs):
+            loop = asyncio.get_event_loop()
+            call = functools.partial(func, *args, **kwargs)
+            return await loop.run_in_executor(type(args[0])._fsm_executor, call)
+
+        async def arun(*args, **kwargs):
+            """Run the transition function in the class's executor; see
+            `StateMachine.arun`"""
+            if not built:
+                check_conditions = _conditions.async_checker(
+                    self.conditions, self.conditions_mode
+                )
+                built.append(
+                    self._async_observed(
+                        offloaded,
+                        check_conditions,
+                        self._traced_calls(offloaded),
+                        optimistic=True,
+                    )
                 )
-                raise InvalidStartState(exception_message)
+            return await built[0](args, kwargs)
 
-            conditions_not_met = []
-            for condition in self.conditions:
-                if asyncio.iscoroutinefunction(condition):
+        return arun
+
+    def _sync_checks(self, func, observed):
+        name = func.__name__
+        conditions = self.conditions
+
+        def can(*args, **kwargs):
+            """Return True if the transition is allowed, without running it"""
+            state_machine = args[0]
+            if (state_machine.state, name) not in type(state_machine)._fsm_table:
+                return False
+            for condition in conditions:
+                if condition(*args, **kwargs) is not True:
+                    return False
+            return True
+
+        def try_(*args, **kwargs):
+            """Run the transition; return a TransitionResult instead of raising
+            TransitionNotAllowed when the transition is not allowed"""
+            return observed(args, kwargs, True)
+
+        return can, try_
+
+    def _async_checks(self, func, observed):
+        name = func.__name__
+        conditions = [
+            (condition, asyncio.iscoroutinefunction(condition))
+            for condition in self.conditions
+        ]
+
+        async def can(*args, **kwargs):
+            """Return True if the transition is allowed, without running it"""
+            state_machine = args[0]
+            if (state_machine.state, name) not in type(state_machine)._fsm_table:
+                return False
+            for condition, is_coroutine in conditions:
+                if is_coroutine:
                     condition_result = await condition(*args, **kwargs)
                 else:
                     condition_result = condition(*args, **kwargs)
                 if condition_result is not True:
-                    conditions_not_met.append(condition)
-            if conditions_not_met:
-                raise ConditionsNotMet(conditions_not_met)
+                    return False
+            return True
+
+        async def try_(*args, **kwargs):
+            """Run the transition; return a TransitionResult instead of raising
+            TransitionNotAllowed when the transition is not allowed"""
+            return await observed(args, kwargs, True)
+
+        return can, try_
+
+    def _bulk(self, wrapper):
+        name = wrapper.__name__
+        target = self.target
+
+        def bulk(machines_or_codes):
+            """Apply the transition to many machines in a single pass
+
+            Accepts either a sequence of state machine instances or a mutable
+            array of state codes from `StateMachine.encode_states`. Only the
+            state is changed: the transition function is not called and no
+            exception is raised for rows in an invalid start state.
+
+            Machines of classes with observers or the thread_safe option
+            send events and set their state with compare_and_set_state,
+            see _bulk_observed; state codes are never observed.
+
+            Returns a bytes mask with 1 for rows that transitioned, else 0.
+            """
+            if self.conditions:
+                raise ValueError(f"{name} has conditions; cannot run in bulk")
+
+            if isinstance(machines_or_codes, (array, bytearray, memoryview)) or (
+                hasattr(machines_or_codes, "__array__")
+            ):
+                owner = getattr(wrapper, "_fsm_owner", None)
+                if owner is None:
+                    raise ValueError(f"{name} is not defined on a StateMachine")
+                return _bulk_codes(
+                    machines_or_codes,
+                    [owner._fsm_state_codes[state] for state in self.source],
+                    owner._fsm_state_codes[target],
+                )
+
+            mask = bytearray(len(machines_or_codes))
+            for i, state_machine in enumerate(machines_or_codes):
+                machine_class = type(state_machine)
+                if machine_class._fsm_slow_path:
+                    mask[i] = _bulk_observed(state_machine, wrapper._fsm)
+                elif (state_machine.state, name) in machine_class._fsm_table:
+                    state_machine.state = target
+                    mask[i] = 1
+            return bytes(mask)
+
+        return bulk
+
+    def _traced_calls(self, func):
+        """Getter for (check_conditions, func) recording tracing spans
+
+        Built on first use; tracing.py needs contextvars (Python 3.7+), so
+        it is only imported once a Tracer observes the machine.
+        """
+        conditions = self.conditions
+        mode = self.conditions_mode
+        concurrent = self.concurrent_conditions
+        traced = []
+
+        def make_checker(conditions):
+            if asyncio.iscoroutinefunction(func):
+                return _conditions.async_checker(conditions, mode, concurrent)
+            return _conditions.sync_checker(conditions, mode)
+
+        def traced_calls():
+            if not traced:
+                from .tracing import traced_calls
+
+                traced.append(traced_calls(func, conditions, make_checker))
+            return traced[0]
+
+        return traced_calls
+
+    def _sync_observed(self, func, check_conditions, traced_calls):
+        """Transition that sends events to the machine's observers and
+        applies the class's thread_safe option; every entry point but the
+        fast path runs it. With `results`, it returns a TransitionResult
+        instead of raising TransitionNotAllowed."""
+        details = func._fsm
+        conditions = self.conditions
+        name = func.__name__
+        source = self.source
+        target = self.target
+
+        def observed(args, kwargs, results=False, claimed=False):
+            state_machine = args[0]
+            machine_class = type(state_machine)
+            optimistic = machine_class._fsm_thread_safe
+            if optimistic is True:
+                if not claimed:
+                    _claim(state_machine)
+                    try:
+                        return observed(args, kwargs, results, True)
+                    finally:
+                        _release(state_machine)
+                # the claim keeps other threads' transitions out
+                optimistic = False
+            observers = machine_class._fsm_observers
+            check, body = check_conditions, func
+            if machine_class._fsm_traced:
+                check, body = traced_calls()
+            start_state = state_machine.state
+            event = _started(state_machine, details, start_state) if observers else None
 
-            if not self.on_error:
-                result = await func(*args, **kwargs)
-                state_machine.state = self.target
-                return result
+            if (start_state, name) not in machine_class._fsm_table:
+                error = InvalidStartState(start_state, name, source)
+                return _rejected(event, error, results)
+            if conditions:
+                try:
+                    conditions_not_met = check(args, kwargs)
+                except Exception as error:
+                    _report(event, "on_error", error)
+                    raise
+                if conditions_not_met:
+                    error = ConditionsNotMet(conditions_not_met)
+                    return _rejected(event, error, results)
 
             try:
-                result = await func(*args, **kwargs)
-                state_machine.state = self.target
-                return result
-            except Exception:
-                # TODO should we log this somewhere?
-                # logger.error? maybe have an optional parameter to set this up
-                # how to libraries log?
-                state_machine.state = self.on_error
-                return
+                result = body(*args, **kwargs)
+            except Exception as error:
+                return _failed(
+                    state_machine,
+                    start_state,
+                    details,
+                    optimistic,
+                    event,
+                    error,
+                    results,
+                )
+            if event is None and not optimistic:
+                state_machine.state = target
+                return _transition_result((True, result, None)) if results else result
+            return _succeeded(
+                state_machine, start_state, details, optimistic, event, result, results
+            )
 
-        if asyncio.iscoroutinefunction(func):
-            return async_callable
-        else:
-            return sync_callable
+        return observed
+
+    def _async_observed(self, func, check_conditions, traced_calls, optimistic=False):
+        """Transition that sends events to the machine's observers and
+        applies the class's thread_safe option; see _sync_observed"""
+        details = func._fsm
+        conditions = self.conditions
+        name = func.__name__
+        source = self.source
+        target = self.target
+
+        async def observed(args, kwargs, results=False):
+            # a lock can't be held across awaits, so async transitions of
+            # thread-safe classes are always optimistic
+            is_optimistic = optimistic or bool(type(args[0])._fsm_thread_safe)
+            return await run(args, kwargs, is_optimistic, results)
+
+        async def run(args, kwargs, optimistic, results):
+            state_machine = args[0]
+            machine_class = type(state_machine)
+            observers = machine_class._fsm_observers
+            check, body = check_conditions, func
+            if machine_class._fsm_traced:
+                check, body = traced_calls()
+            deadline = _claim_deadline(state_machine, name)
+            if deadline is not None:
+                check = _until_deadline(check, deadline)
+                body = _until_deadline(body, deadline)
+            start_state = state_machine.state
+            event = _started(state_machine, details, start_state) if observers else None
+
+            if (start_state, name) not in machine_class._fsm_table:
+                error = InvalidStartState(start_state, name, source)
+                return _rejected(event, error, results)
+            if conditions:
+                try:
+                    conditions_not_met = await check(args, kwargs)
+                except (Exception, asyncio.CancelledError) as error:
+                    _report(event, "on_error", error)
+                    raise
+                if conditions_not_met:
+                    error = ConditionsNotMet(conditions_not_met)
+                    return _rejected(event, error, results)
+
+            try:
+                result = await body(*args, **kwargs)
+            except asyncio.CancelledError as error:
+                # observers still get an event for the on_start they got
+                _report(event, "on_error", error)
+                raise
+            except Exception as error:
+                return _failed(
+                    state_machine,
+                    start_state,
+                    details,
+                    optimistic,
+                    event,
+                    error,
+                    results,
+                )
+            if event is None and not optimistic:
+                state_machine.state = target
+                return _transition_result((True, result, None)) if results else result
+            return _succeeded(
+                state_machine, start_state, details, optimistic, event, result, results
+            )
+
+        return observed
+
+    def _sync_fast_path(self, func, observed):
+        """Transition without conditions or on_error state"""
+        name = func.__name__
+        source = self.source
+        target = self.target
+
+        def sync_callable(*args, **kwargs):
+            state_machine = args[0]
+            machine_class = type(state_machine)
+            if machine_class._fsm_slow_path:
+                return observed(args, kwargs)
+
+            if (state_machine.state, name) not in machine_class._fsm_table:
+                raise InvalidStartState(state_machine.state, name, source)
+
+            result = func(*args, **kwargs)
+            state_machine.state = target
+            return result
+
+        return sync_callable
+
+    def _sync_callable(self, observed):
+        """Transition with conditions or an on_error state"""
+
+        def sync_callable(*args, **kwargs):
+            return observed(args, kwargs)
+
+        return sync_callable
+
+    def _async_fast_path(self, func, observed):
+        """Transition without conditions or on_error state"""
+        name = func.__name__
+        source = self.source
+        target = self.target
+
+        async def async_callable(*args, **kwargs):
+            state_machine = args[0]
+            machine_class = type(state_machine)
+            if machine_class._fsm_slow_path:
+                return await observed(args, kwargs)
+
+            if (state_machine.state, name) not in machine_class._fsm_table:
+                raise InvalidStartState(state_machine.state, name, source)
+
+            result = await func(*args, **kwargs)
+            state_machine.state = target
+            return result
+
+        return async_callable
+
+    def _async_callable(self, observed):
+        """Transition with conditions or an on_error state"""
+
+        async def async_callable(*args, **kwargs):
+            return await observed(args, kwargs)
+
+        return async_callable
+
+
+def _started(state_machine, details, start_state):
+    """Send the start of a transition to the machine's observers"""
+    event = TransitionEvent(
+        state_machine, details, start_state, time.perf_counter(), 0.0, None
+    )
+    for observer in type(state_machine)._fsm_observers:
+        observer.on_start(event)
+    return event
+
+
+def _report(event, method, error=None):
+    """Send the end of a transition started with `_started`, if it was"""
+    if event is None:
+        return
+    duration = time.perf_counter() - event.started_at
+    ended = event._replace(duration=duration, error=error)
+    for observer in type(event.machine)._fsm_observers:
+        getattr(observer, method)(ended)
+
+
+def _rejected(event, error, results):
+    _report(event, "on_reject", error)
+    if not results:
+        raise error
+    return _transition_result((False, None, error))
+
+
+def _succeeded(state_machine, start_state, details, optimistic, event, result, results):
+    """Move to the target state after the transition function returned"""
+    try:
+        _set_state(state_machine, start_state, details.target, details.name, optimistic)
+    except StaleTransition as error:
+        return _rejected(event, error, results)
+    _report(event, "on_end")
+    return _transition_result((True, result, None)) if results else result
+
+
+def _failed(state_machine, start_state, details, optimistic, event, error, results):
+    """Move to the on_error state after the transition function raised
+    `error`, which is raised again if there is none"""
+    on_error = details.on_error
+    if on_error:
+        try:
+            _set_state(state_machine, start_state, on_error, details.name, optimistic)
+        except StaleTransition as stale:
+            _report(event, "on_error", error)
+            if not results:
+                raise stale from error
+            stale.__cause__ = error
+            return _transition_result((False, None, stale))
+    _report(event, "on_error", error)
+    if not on_error:
+        raise error
+    # errors are reported to observers, see StateMachine.add_observer
+    return _transition_result((True, None, None)) if results else None
+
+
+def _bulk_observed(state_machine, details):
+    """Bulk transition of one machine of a class on the observed path;
+    returns whether the state changed"""
+    machine_class = type(state_machine)
+    start_state = state_machine.state
+    event = None
+    if machine_class._fsm_observers:
+        event = _started(state_machine, details, start_state)
+    if (start_state, details.name) not in machine_class._fsm_table:
+        error = InvalidStartState(start_state, details.name, details.source)
+        return _rejected(event, error, True).ok
+    # no claim is taken, so thread-safe classes set the state optimistically
+    optimistic = bool(machine_class._fsm_thread_safe)
+    outcome = _succeeded(
+        state_machine, start_state, details, optimistic, event, None, True
+    )
+    return outcome.ok
+
+
+def _bulk_codes(codes, source_codes, target_code):
+    """Check and update an integer state column in place"""
+    try:
+        view = memoryview(codes)
+    except TypeError:
+        view = None
+
+    if (
+        view is not None
+        and view.itemsize == 1
+        and view.c_contiguous
+        and not view.readonly
+    ):
+        view = view.cast("B")
+        # one byte per row: both the check and the update are a single
+        # bytes.translate call over the whole column
+        mask_table = bytearray(256)
+        update_table = bytearray(range(256))
+        for code in source_codes:
+            mask_table[code] = 1
+            update_table[code] = target_code
+        column = view.tobytes()
+        view[:] = column.translate(update_table)
+        return column.translate(mask_table)
+
+    source_codes = frozenset(source_codes)
+    mask = bytearray(len(codes))
+    for i, code in enumerate(codes):
+        if code in source_codes:
+            codes[i] = target_code
+            mask[i] = 1
+    return bytes(mask)
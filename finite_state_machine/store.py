@@ -0,0 +1,229 @@
+from abc import ABC, abstractmethod
+import re
+import sqlite3
+import threading
+
+from .exceptions import VersionConflict
+from .state_machine import _state_value
+
+# ids per SELECT, below SQLite's default limit of 999 parameters
+_LOAD_CHUNK = 500
+
+
+class StateStore(ABC):
+    """Base class for state stores
+
+    A store keeps the state of machines, keyed by `(kind, machine_id)`
+    where kind is the State Machine class name, with a version that is
+    incremented every time the state is saved.
+    """
+
+    @abstractmethod
+    def load(self, kind, machine_ids):
+        """Stored states: {machine_id: (state, version)}; ids that are
+        not stored are left out"""
+
+    @abstractmethod
+    def save(self, changes):
+        """Save `(kind, machine_id, state, version)` changes atomically
+
+        `version` is the version the state was loaded with, None for
+        machines that are not stored yet. Raises VersionConflict, and
+        saves nothing, if any version changed. Returns the new versions
+        in the order of `changes`.
+        """
+
+    def unit_of_work(self):
+        return UnitOfWork(self)
+
+    def run(self, work, retries=3):
+        """Call `work(unit_of_work)` and commit, starting over with a new
+        unit of work up to `retries` times on a VersionConflict"""
+        for attempt in range(retries + 1):
+            unit_of_work = UnitOfWork(self)
+            result = work(unit_of_work)
+            try:
+                unit_of_work.commit()
+            except VersionConflict:
+                if attempt == retries:
+                    raise
+            else:
+                return result
+
+
+class UnitOfWork:
+    """Machines loaded from a store, whose changed states are saved together
+
+    Machines are created with `factory(machine_id)` and get their stored
+    state, so transitions run in memory; `commit` saves the states that
+    changed in one transaction, checking versions to detect concurrent
+    changes. Used as a context manager, it commits when the block exits
+    without an exception.
+
+        with store.unit_of_work() as unit_of_work:
+            prs = unit_of_work.load(GitHubPullRequest, ids)
+            for pr in prs.values():
+                pr.merge()
+    """
+
+    def __init__(self, store):
+        self.store = store
+        self._tracked = {}  # (kind, machine_id) -> [machine, state, version]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.commit()
+
+    def load(self, factory, machine_ids):
+        """Machines for `machine_ids`, created with `factory(machine_id)`,
+        in one round trip; {machine_id: machine}
+
+        Machines that are not stored keep the state set by the factory
+        and are inserted on commit.
+        """
+        machines = {}
+        for machine_id in machine_ids:
+            machines[machine_id] = factory(machine_id)
+        if not machines:
+            return machines
+
+        cls = type(next(iter(machines.values())))
+        kind = cls.__name__
+        stored = self.store.load(kind, list(machines))
+        states = {_state_value(state): state for state in cls._fsm_states}
+        for machine_id, machine in machines.items():
+            if machine_id in stored:
+                state, version = stored[machine_id]
+                machine.state = states.get(state, state)
+            else:
+                version = None
+            self._tracked[kind, machine_id] = [machine, machine.state, version]
+        return machines
+
+    def add(self, machine_id, machine):
+        """Track a new machine, inserted on commit"""
+        self._tracked[type(machine).__name__, machine_id] = [machine, None, None]
+
+    def changes(self):
+        """`(kind, machine_id, state, version)` of machines to save"""
+        return [
+            (kind, machine_id, machine.state, version)
+            for (kind, machine_id), (machine, state, version) in self._tracked.items()
+            if version is None or machine.state != state
+        ]
+
+    def commit(self):
+        """Save changed states; raises VersionConflict if any of them were
+        changed by someone else since they were loaded"""
+        changes = self.changes()
+        if not changes:
+            return
+        versions = self.store.save(changes)
+        for (kind, machine_id, state, _), version in zip(changes, versions):
+            tracked = self._tracked[kind, machine_id]
+            tracked[1] = state
+            tracked[2] = version
+
+    def rollback(self):
+        """Put tracked machines back in the state they were loaded with"""
+        for machine, state, version in self._tracked.values():
+            if version is not None:
+                machine.state = state
+
+
+class SQLiteStateStore(StateStore):
+    """State store backed by an SQLite table
+
+    Saves are conditional updates on the version column inside one
+    transaction, so several processes can share the database.
+    Enum states are stored as their value.
+    """
+
+    def __init__(self, database, table="fsm_states", timeout=5.0):
+        if not re.fullmatch(r"[A-Za-z_][A-Za-z0-9_]*", table):
+            raise ValueError(f"Invalid table name: {table}")
+        self.table = table
+        # transactions are started explicitly, see save()
+        self._connection = sqlite3.connect(
+            database, timeout=timeout, isolation_level=None, check_same_thread=False
+        )
+        self._lock = threading.Lock()
+        with self._lock:
+            if database != ":memory:":
+                self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                f"CREATE TABLE IF NOT EXISTS {table} ("
+                "kind TEXT NOT NULL, "
+                "machine_id NOT NULL, "
+                "state, "
+                "version INTEGER NOT NULL, "
+                "PRIMARY KEY (kind, machine_id))"
+            )
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def load(self, kind, machine_ids):
+        stored = {}
+        with self._lock:
+            for start in range(0, len(machine_ids), _LOAD_CHUNK):
+                end = start + _LOAD_CHUNK
+                chunk = machine_ids[start:end]
+                placeholders = ",".join("?" * len(chunk))
+                rows = self._connection.execute(
+                    f"SELECT machine_id, state, version FROM {self.table} "
+                    f"WHERE kind = ? AND machine_id IN ({placeholders})",
+                    [kind, *chunk],
+                )
+                for machine_id, state, version in rows:
+                    stored[machine_id] = (state, version)
+        return stored
+
+    def save(self, changes):
+        inserts = []
+        updates = []
+        for kind, machine_id, state, version in changes:
+            if version is None:
+                inserts.append((kind, machine_id, _state_value(state)))
+            else:
+                updates.append((_state_value(state), kind, machine_id, version))
+
+        with self._lock:
+            connection = self._connection
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                saved = connection.executemany(
+                    f"INSERT OR IGNORE INTO {self.table} "
+                    "(kind, machine_id, state, version) VALUES (?, ?, ?, 1)",
+                    inserts,
+                ).rowcount
+                saved += connection.executemany(
+                    f"UPDATE {self.table} SET state = ?, version = version + 1 "
+                    "WHERE kind = ? AND machine_id = ? AND version = ?",
+                    updates,
+                ).rowcount
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            if saved != len(changes):
+                connection.execute("ROLLBACK")
+                raise VersionConflict(self._conflicts(changes))
+            connection.execute("COMMIT")
+
+        return [1 if version is None else version + 1 for *_, version in changes]
+
+    def _conflicts(self, changes):
+        conflicts = []
+        for kind, machine_id, _, version in changes:
+            row = self._connection.execute(
+                f"SELECT version FROM {self.table} WHERE kind = ? AND machine_id = ?",
+                (kind, machine_id),
+            ).fetchone()
+            stored_version = None if row is None else row[0]
+            if stored_version != version:
+                conflicts.append((kind, machine_id))
+        return conflicts
@@ -0,0 +1,219 @@
+import asyncio
+from collections import deque
+from collections.abc import Mapping
+import time
+from typing import Any, NamedTuple, Optional
+
+from .exceptions import TransitionNotAllowed
+
+
+class EventResult(NamedTuple):
+    """Outcome of applying one record
+
+    `ok` is False when the transition was not allowed (`error` is the
+    TransitionNotAllowed) or raised (`error` is the exception).
+    """
+
+    entity_id: Any
+    event: str
+    ok: bool
+    result: Any
+    error: Optional[BaseException]
+
+
+class StreamStats:
+    """Counters for an EventProcessor, updated while the stream is consumed"""
+
+    def __init__(self):
+        self.records = 0
+        self.applied = 0
+        self.rejected = 0
+        self.errors = 0
+        self.elapsed = 0.0
+        # async streams: most records in flight, and how often / how long
+        # reading the stream paused because max_in_flight was reached
+        self.max_in_flight = 0
+        self.backpressure_waits = 0
+        self.backpressure_seconds = 0.0
+
+    @property
+    def throughput(self):
+        """Records processed per second"""
+        if not self.elapsed:
+            return 0.0
+        return self.records / self.elapsed
+
+    def __repr__(self):
+        return (
+            f"<StreamStats records={self.records} applied={self.applied} "
+            f"rejected={self.rejected} errors={self.errors} "
+            f"throughput={self.throughput:.0f}/s>"
+        )
+
+
+class EventProcessor:
+    """Apply a stream of `(entity_id, event, payload)` records to machines
+
+    Machines are looked up by id in `machines` and created with
+    `factory(entity_id)` the first time an id is seen. Each record calls
+    `machine.send(event)`; a Mapping payload is passed as keyword
+    arguments, any other payload except None as a single argument.
+
+    Records are read one at a time and results are yielded as they are
+    produced, so the stream is never held in memory. Rejected and failed
+    records are yielded too, see EventResult.
+    """
+
+    def __init__(self, factory, machines=None, max_in_flight=64):
+        if max_in_flight < 1:
+            raise ValueError("max_in_flight must be at least 1")
+        self.factory = factory
+        self.machines = {} if machines is None else machines
+        self.max_in_flight = max_in_flight
+        self.stats = StreamStats()
+
+    def machine(self, entity_id):
+        try:
+            return self.machines[entity_id]
+        except KeyError:
+            machine = self.machines[entity_id] = self.factory(entity_id)
+            return machine
+
+    def _result(self, entity_id, event, ok, result, error):
+        stats = self.stats
+        stats.records += 1
+        if ok:
+            stats.applied += 1
+        elif isinstance(error, TransitionNotAllowed):
+            stats.rejected += 1
+        else:
+            stats.errors += 1
+        return EventResult(entity_id, event, ok, result, error)
+
+    def process(self, records):
+        """Generator applying records from an iterable with `send`"""
+        machine = self.machine
+        apply = self._apply
+        started_at = time.perf_counter()
+        elapsed = self.stats.elapsed
+        for entity_id, event, payload in records:
+            outcome = apply(machine(entity_id), entity_id, event, payload)
+            self.stats.elapsed = elapsed + time.perf_counter() - started_at
+            yield outcome
+
+    async def aprocess(self, records):
+        """Async generator applying records from an iterable or async iterator
+
+        Records for async transitions are applied concurrently with
+        `asend`, up to `max_in_flight` at a time; sync transitions run
+        inline. Records for the same entity are applied one at a time, in
+        stream order; results are yielded in the order they complete.
+        """
+        stats = self.stats
+        started_at = time.perf_counter()
+        elapsed = stats.elapsed
+
+        # entity id -> records waiting for the entity's in-flight record
+        waiting = {}
+        running = {}  # task -> entity id
+        in_flight = 0
+
+        def start(entity_id, event, payload):
+            coroutine = self._aapply(entity_id, event, payload)
+            running[asyncio.ensure_future(coroutine)] = entity_id
+
+        def submit(record):
+            nonlocal in_flight
+            entity_id = record[0]
+            in_flight += 1
+            stats.max_in_flight = max(stats.max_in_flight, in_flight)
+            if entity_id in waiting:
+                waiting[entity_id].append(record)
+            else:
+                waiting[entity_id] = deque()
+                start(*record)
+
+        async def completed():
+            nonlocal in_flight
+            done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            outcomes = []
+            for task in done:
+                entity_id = running.pop(task)
+                in_flight -= 1
+                if waiting[entity_id]:
+                    start(*waiting[entity_id].popleft())
+                else:
+                    del waiting[entity_id]
+                outcomes.append(task.result())
+            stats.elapsed = elapsed + time.perf_counter() - started_at
+            return outcomes
+
+        try:
+            async for record in _aiter(records):
+                entity_id, event, payload = record
+                if entity_id not in waiting:
+                    machine = self.machine(entity_id)
+                    if not _is_async(machine, event):
+                        yield self._apply(machine, entity_id, event, payload)
+                        stats.elapsed = elapsed + time.perf_counter() - started_at
+                        continue
+
+                if in_flight >= self.max_in_flight:
+                    stats.backpressure_waits += 1
+                    wait_started_at = time.perf_counter()
+                    while in_flight >= self.max_in_flight:
+                        for outcome in await completed():
+                            yield outcome
+                    stats.backpressure_seconds += time.perf_counter() - wait_started_at
+                submit(record)
+
+            while running:
+                for outcome in await completed():
+                    yield outcome
+        finally:
+            for task in running:
+                task.cancel()
+
+    def _apply(self, machine, entity_id, event, payload):
+        try:
+            result = _send(machine, event, payload)
+        except Exception as error:
+            return self._result(entity_id, event, False, None, error)
+        return self._result(entity_id, event, True, result, None)
+
+    async def _aapply(self, entity_id, event, payload):
+        try:
+            result = await _asend(self.machine(entity_id), event, payload)
+        except Exception as error:
+            return self._result(entity_id, event, False, None, error)
+        return self._result(entity_id, event, True, result, None)
+
+
+def _is_async(machine, event):
+    entry = machine._fsm_events.get((machine.state, event))
+    return entry is not None and entry[0]
+
+
+def _send(machine, event, payload):
+    if payload is None:
+        return machine.send(event)
+    if isinstance(payload, Mapping):
+        return machine.send(event, **payload)
+    return machine.send(event, payload)
+
+
+async def _asend(machine, event, payload):
+    if payload is None:
+        return await machine.asend(event)
+    if isinstance(payload, Mapping):
+        return await machine.asend(event, **payload)
+    return await machine.asend(event, payload)
+
+
+async def _aiter(records):
+    if hasattr(records, "__aiter__"):
+        async for record in records:
+            yield record
+    else:
+        for record in records:
+            yield record
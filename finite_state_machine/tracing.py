@@ -0,0 +1,244 @@
+import asyncio
+import contextvars
+import functools
+import json
+import random
+import threading
+import time
+
+from .observers import TransitionObserver
+
+_current_span = contextvars.ContextVar("finite_state_machine_span", default=None)
+
+
+def current_span():
+    """Span of the transition (or condition) running in this context"""
+    return _current_span.get()
+
+
+class Span:
+    """A timed operation, modelled on the OpenTelemetry span data model
+
+    Times are nanoseconds since the epoch. `status` is "UNSET" until the
+    span ends, then "OK" or "ERROR".
+    """
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "start_time",
+        "end_time",
+        "attributes",
+        "status",
+        "status_message",
+        "tracer",
+        "_token",
+    )
+
+    def __init__(self, name, tracer, parent=None, attributes=None):
+        self.name = name
+        self.tracer = tracer
+        if parent is None:
+            self.trace_id = f"{random.getrandbits(128):032x}"
+            self.parent_id = None
+        else:
+            self.trace_id = parent.trace_id
+            self.parent_id = parent.span_id
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.attributes = attributes or {}
+        self.status = "UNSET"
+        self.status_message = ""
+        self.start_time = time.time_ns()
+        self.end_time = None
+        self._token = None
+
+    @property
+    def duration(self):
+        """Seconds between start and end, None while the span is running"""
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) / 1e9
+
+    def end(self, error=None):
+        self.end_time = time.time_ns()
+        if error is None:
+            self.status = "OK"
+        else:
+            self.status = "ERROR"
+            self.status_message = f"{type(error).__name__}: {error}"
+        self.tracer.exporter.export(self)
+
+    def to_dict(self):
+        """JSON-serializable dict using OTLP field names"""
+        return {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id,
+            "name": self.name,
+            "startTimeUnixNano": self.start_time,
+            "endTimeUnixNano": self.end_time,
+            "attributes": self.attributes,
+            "status": {"code": self.status, "message": self.status_message},
+        }
+
+    def __repr__(self):
+        return f"<Span {self.name} {self.status} span_id={self.span_id}>"
+
+
+class InMemoryExporter:
+    """Keeps finished spans in `spans`, in the order they ended"""
+
+    def __init__(self):
+        self.spans = []
+
+    def export(self, span):
+        self.spans.append(span)
+
+    def clear(self):
+        self.spans.clear()
+
+
+class FileExporter:
+    """Appends finished spans to a file, one JSON object per line"""
+
+    def __init__(self, path):
+        self.path = path
+        self._file = open(path, "a")
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = json.dumps(span.to_dict(), default=repr) + "\n"
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        with self._lock:
+            self._file.close()
+
+
+class Tracer(TransitionObserver):
+    """Observer that records a span for every transition
+
+    Each transition gets a span with a child span per condition evaluated
+    and one for the transition function. The running span is kept in a
+    context variable, so transitions called while another one runs (also
+    from tasks it starts) are recorded as its children.
+
+    Add one Tracer per class hierarchy, e.g. `StateMachine.add_observer`.
+    """
+
+    # tells transitions to wrap their conditions and function in spans
+    traces_calls = True
+
+    def __init__(self, exporter=None):
+        self.exporter = InMemoryExporter() if exporter is None else exporter
+
+    def on_start(self, event):
+        attributes = {
+            "fsm.machine": type(event.machine).__name__,
+            "fsm.transition": event.name,
+            "fsm.source": event.source,
+            "fsm.target": event.target,
+        }
+        span = Span(
+            f"{type(event.machine).__name__}.{event.name}",
+            self,
+            parent=_current_span.get(),
+            attributes=attributes,
+        )
+        span._token = _current_span.set(span)
+
+    def _end(self, event):
+        span = _current_span.get()
+        if span is None or span.tracer is not self:
+            return
+        _current_span.reset(span._token)
+        if event.error is not None:
+            span.attributes["fsm.error"] = type(event.error).__name__
+        span.end(event.error)
+
+    on_end = on_reject = on_error = _end
+
+
+def traced_calls(func, conditions, make_checker):
+    """Condition checker and transition function that record child spans
+
+    `make_checker` builds a checker (see conditions.py) from a list of
+    conditions; failed conditions are reported as the original functions.
+    """
+    originals = {_traced(condition, "condition"): condition for condition in conditions}
+    check_conditions = make_checker(list(originals))
+
+    if asyncio.iscoroutinefunction(func):
+
+        async def traced_check(args, kwargs):
+            conditions_not_met = await check_conditions(args, kwargs)
+            return [originals[condition] for condition in conditions_not_met]
+
+    else:
+
+        def traced_check(args, kwargs):
+            conditions_not_met = check_conditions(args, kwargs)
+            return [originals[condition] for condition in conditions_not_met]
+
+    return traced_check, _traced(func, "transition_function")
+
+
+def _traced(function, kind):
+    """Wrap `function` in a child span of the running span, if there is one"""
+    name = function.__name__
+
+    def start(parent):
+        span = Span(name, parent.tracer, parent=parent, attributes={"fsm.kind": kind})
+        span._token = _current_span.set(span)
+        return span
+
+    def end(span, result):
+        _current_span.reset(span._token)
+        if kind == "condition":
+            span.attributes["fsm.condition.passed"] = result is True
+        span.end()
+
+    def fail(span, error):
+        _current_span.reset(span._token)
+        span.end(error)
+
+    if asyncio.iscoroutinefunction(function):
+
+        @functools.wraps(function)
+        async def traced(*args, **kwargs):
+            parent = _current_span.get()
+            if parent is None:
+                return await function(*args, **kwargs)
+            span = start(parent)
+            try:
+                result = await function(*args, **kwargs)
+            except BaseException as error:
+                fail(span, error)
+                raise
+            end(span, result)
+            return result
+
+    else:
+
+        @functools.wraps(function)
+        def traced(*args, **kwargs):
+            parent = _current_span.get()
+            if parent is None:
+                return function(*args, **kwargs)
+            span = start(parent)
+            try:
+                result = function(*args, **kwargs)
+            except BaseException as error:
+                fail(span, error)
+                raise
+            end(span, result)
+            return result
+
+    return traced
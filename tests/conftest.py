@@ -0,0 +1,46 @@
+import pytest
+
+from finite_state_machine import StateMachine, transition
+
+
+def is_powered(machine):
+    return machine.powered
+
+
+class _LightSwitch(StateMachine):
+    def __init__(self, id=None):
+        self.id = id
+        self.state = "off"
+        self.powered = True
+        super().__init__()
+
+    @transition(source="off", target="on", conditions=[is_powered])
+    def turn_on(self):
+        return "on"
+
+    @transition(source="on", target="off")
+    def turn_off(self):
+        pass
+
+    @transition(source="on", target="off", on_error="broken")
+    def break_switch(self):
+        raise ValueError("broken")
+
+    @transition(source="off", target="on")
+    async def async_turn_on(self):
+        return "on"
+
+    @transition(source="on", target="off")
+    async def async_fail(self):
+        raise ValueError("async failure")
+
+
+@pytest.fixture
+def LightSwitch():
+    """A new LightSwitch class per test, so observers added to it don't
+    leak into other tests"""
+
+    class LightSwitch(_LightSwitch):
+        pass
+
+    return LightSwitch
@@ -0,0 +1,351 @@
+import asyncio
+import time
+
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.conditions import AdaptiveOrder, CacheInfo, cached_condition
+from finite_state_machine.exceptions import ConditionsNotMet
+
+
+def slow_condition(machine):
+    time.sleep(0.001)
+    return False
+
+
+def cheap_condition(machine):
+    return False
+
+
+def always_true(machine):
+    return True
+
+
+def test_adaptive_order_moves_cheap_rejecting_conditions_first():
+    adaptive = AdaptiveOrder([always_true, slow_condition, cheap_condition])
+    adaptive.interval = 4
+
+    for _ in range(4):
+        adaptive.check((None,), {})
+
+    # slow_condition rejected every call so far; cheap_condition never ran,
+    # so it's tried first to measure it
+    assert adaptive.order == [cheap_condition, slow_condition, always_true]
+
+    adaptive.stats[slow_condition] = [1, 1, 1.0]
+    for _ in range(4):
+        adaptive.check((None,), {})
+
+    assert adaptive.order == [cheap_condition, slow_condition, always_true]
+    assert adaptive.check((None,), {}) == [cheap_condition]
+
+
+def test_adaptive_order_measures_conditions_behind_a_rejecting_one():
+    calls = []
+
+    def slow_rejects(machine):
+        calls.append("slow")
+        time.sleep(0.0001)
+        return False
+
+    def cheap_rejects(machine):
+        calls.append("cheap")
+        return False
+
+    adaptive = AdaptiveOrder([slow_rejects, cheap_rejects])
+    adaptive.interval = 8
+    for _ in range(64):
+        adaptive.check((None,), {})
+
+    assert adaptive.order == [cheap_rejects, slow_rejects]
+    assert calls.count("cheap") > calls.count("slow")
+
+
+def test_adaptive_order_returns_no_failures_when_conditions_pass():
+    adaptive = AdaptiveOrder([always_true])
+
+    assert adaptive.check((None,), {}) == []
+    assert adaptive.stats[always_true][:2] == [1, 0]
+
+
+@pytest.mark.asyncio
+async def test_adaptive_order_with_async_conditions():
+    async def async_rejects(machine):
+        return False
+
+    adaptive = AdaptiveOrder([always_true, async_rejects])
+
+    assert await adaptive.acheck((None,), {}) == [async_rejects]
+    assert adaptive.stats[async_rejects][:2] == [1, 1]
+
+
+class TestConcurrentConditions:
+    class Gate(StateMachine):
+        def __init__(self):
+            self.state = "closed"
+            super().__init__()
+
+    @staticmethod
+    def make_condition(name, result, delay, events):
+        async def condition(machine):
+            events.append(f"{name} started")
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                events.append(f"{name} cancelled")
+                raise
+            events.append(f"{name} finished")
+            return result
+
+        condition.__name__ = name
+        return condition
+
+    @pytest.mark.asyncio
+    async def test_async_conditions_run_concurrently(self):
+        events = []
+        first = self.make_condition("first", True, 0.02, events)
+        second = self.make_condition("second", True, 0.01, events)
+
+        class Gate(self.Gate):
+            @transition(
+                source="closed",
+                target="open",
+                conditions=[first, second],
+                concurrent_conditions=True,
+            )
+            async def open(self):
+                pass
+
+        gate = Gate()
+        await gate.open()
+
+        assert gate.state == "open"
+        assert events == [
+            "first started",
+            "second started",
+            "second finished",
+            "first finished",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_all_failures_are_listed_in_declaration_order(self):
+        events = []
+        first = self.make_condition("first", False, 0.02, events)
+        second = self.make_condition("second", False, 0.01, events)
+
+        class Gate(self.Gate):
+            @transition(
+                source="closed",
+                target="open",
+                conditions=[first, second],
+                concurrent_conditions=True,
+            )
+            async def open(self):
+                pass
+
+        with pytest.raises(ConditionsNotMet, match="first, second"):
+            await Gate().open()
+
+    @pytest.mark.asyncio
+    async def test_fail_fast_cancels_remaining_conditions(self):
+        events = []
+        slow = self.make_condition("slow", True, 1, events)
+        fails = self.make_condition("fails", False, 0, events)
+
+        class Gate(self.Gate):
+            @transition(
+                source="closed",
+                target="open",
+                conditions=[slow, fails],
+                conditions_mode="fail_fast",
+                concurrent_conditions=True,
+            )
+            async def open(self):
+                pass
+
+        with pytest.raises(ConditionsNotMet, match="fails$"):
+            await Gate().open()
+
+        assert events == [
+            "slow started",
+            "fails started",
+            "fails finished",
+            "slow cancelled",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_sync_conditions_are_checked_first(self):
+        events = []
+        async_condition = self.make_condition("async_condition", True, 0, events)
+
+        def sync_condition(machine):
+            return False
+
+        class Gate(self.Gate):
+            @transition(
+                source="closed",
+                target="open",
+                conditions=[async_condition, sync_condition],
+                conditions_mode="fail_fast",
+                concurrent_conditions=True,
+            )
+            async def open(self):
+                pass
+
+        with pytest.raises(ConditionsNotMet, match="sync_condition"):
+            await Gate().open()
+
+        assert events == []
+
+    def test_concurrent_conditions_require_async_transition(self):
+        with pytest.raises(ValueError, match="requires an async transition"):
+
+            @transition(source="a", target="b", concurrent_conditions=True)
+            def state_transition(instance):
+                pass
+
+    def test_concurrent_conditions_cannot_be_adaptive(self):
+        with pytest.raises(ValueError, match="cannot run concurrently"):
+            transition(
+                source="a",
+                target="b",
+                conditions_mode="adaptive",
+                concurrent_conditions=True,
+            )
+
+
+class TestCachedCondition:
+    class PullRequest(StateMachine):
+        def __init__(self):
+            self.state = "opened"
+            self.num_approvals = 0
+            super().__init__()
+
+    def test_cached_condition_runs_once_per_key(self):
+        calls = []
+
+        @cached_condition()
+        def is_approved(machine):
+            calls.append(machine)
+            return machine.num_approvals >= 1
+
+        class PullRequest(self.PullRequest):
+            @transition(source="opened", target="opened", conditions=[is_approved])
+            def comment(self):
+                pass
+
+        pr = PullRequest()
+        pr.num_approvals = 1
+        pr.comment()
+        pr.comment()
+
+        assert len(calls) == 1
+        assert is_approved.cache_info() == CacheInfo(
+            hits=1, misses=1, maxsize=128, currsize=1
+        )
+
+    def test_cache_key_includes_state_and_arguments(self):
+        calls = []
+
+        @cached_condition()
+        def is_admin(machine, user):
+            calls.append(user)
+            return user == "admin"
+
+        pr = self.PullRequest()
+        assert is_admin(pr, "admin") is True
+        assert is_admin(pr, "guest") is False
+        assert is_admin(pr, "admin") is True
+        pr.state = "closed"
+        assert is_admin(pr, "admin") is True
+
+        assert calls == ["admin", "guest", "admin"]
+
+    def test_custom_key_function(self):
+        calls = []
+
+        @cached_condition(key=lambda machine: machine.num_approvals)
+        def is_approved(machine):
+            calls.append(machine.num_approvals)
+            return machine.num_approvals >= 1
+
+        pr = self.PullRequest()
+        assert is_approved(pr) is False
+        assert is_approved(pr) is False
+        pr.num_approvals = 1
+        assert is_approved(pr) is True
+
+        assert calls == [0, 1]
+
+    def test_entries_expire_after_ttl(self, monkeypatch):
+        now = [100.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+
+        @cached_condition(ttl=10)
+        def is_approved(machine):
+            return True
+
+        pr = self.PullRequest()
+        is_approved(pr)
+        now[0] += 5
+        is_approved(pr)
+        now[0] += 10
+        is_approved(pr)
+
+        assert is_approved.cache_info().hits == 1
+        assert is_approved.cache_info().misses == 2
+
+    def test_least_recently_used_entry_is_evicted(self):
+        @cached_condition(maxsize=2)
+        def is_approved(machine):
+            return True
+
+        first, second, third = (self.PullRequest() for _ in range(3))
+        is_approved(first)
+        is_approved(second)
+        is_approved(first)
+        is_approved(third)  # evicts second
+        is_approved(first)
+        is_approved(second)
+
+        info = is_approved.cache_info()
+        assert (info.hits, info.misses, info.currsize) == (2, 4, 2)
+
+    def test_cache_clear(self):
+        @cached_condition()
+        def is_approved(machine):
+            return True
+
+        is_approved(self.PullRequest())
+        is_approved.cache_clear()
+
+        assert is_approved.cache_info() == CacheInfo(0, 0, 128, 0)
+
+    @pytest.mark.asyncio
+    async def test_cached_async_condition(self):
+        calls = []
+
+        @cached_condition(ttl=60)
+        async def is_approved(machine):
+            calls.append(machine)
+            return True
+
+        class PullRequest(self.PullRequest):
+            @transition(source="opened", target="opened", conditions=[is_approved])
+            async def comment(self):
+                pass
+
+        pr = PullRequest()
+        await pr.comment()
+        await pr.comment()
+
+        assert len(calls) == 1
+        assert asyncio.iscoroutinefunction(is_approved)
+
+    @pytest.mark.parametrize(
+        "kwargs,message",
+        [({"ttl": 0}, "ttl must be"), ({"maxsize": 0}, "maxsize must be")],
+    )
+    def test_invalid_limits(self, kwargs, message):
+        with pytest.raises(ValueError, match=message):
+            cached_condition(**kwargs)
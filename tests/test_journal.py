@@ -0,0 +1,225 @@
+import asyncio
+from enum import Enum
+import time
+import uuid
+
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.exceptions import ConditionsNotMet
+from finite_state_machine.journal import (
+    BINARY_MAGIC,
+    JournalRecord,
+    TransitionJournal,
+    read_journal,
+    replay,
+)
+
+
+class Color(Enum):
+    RED = 1
+    GREEN = 2
+
+
+class TrafficLight(StateMachine):
+    def __init__(self, id):
+        self.id = id
+        self.state = Color.RED
+        super().__init__()
+
+    @transition(source=Color.RED, target=Color.GREEN)
+    async def go(self):
+        pass
+
+
+@pytest.fixture(params=["jsonl", "binary"])
+def journal(request, tmp_path, LightSwitch):
+    journal = TransitionJournal(
+        tmp_path / "journal.log", format=request.param, machine_id=lambda m: m.id
+    )
+    LightSwitch.add_observer(journal)
+    TrafficLight.add_observer(journal)
+    yield journal
+    LightSwitch.remove_observer(journal)
+    TrafficLight.remove_observer(journal)
+    journal.close()
+
+
+def test_records_outcomes(journal, LightSwitch):
+    switch = LightSwitch("a")
+    switch.powered = False
+    with pytest.raises(ConditionsNotMet):
+        switch.turn_on()
+    switch.powered = True
+    switch.turn_on()
+    switch.break_switch()
+
+    assert list(read_journal(journal.path)) == []
+    journal.flush()
+
+    records = list(read_journal(journal.path))
+    assert [record[:4] + record[5:] for record in records] == [
+        ("a", "turn_on", "off", "off", "rejected"),
+        ("a", "turn_on", "off", "on", "ok"),
+        ("a", "break_switch", "on", "broken", "error"),
+    ]
+    assert all(isinstance(record, JournalRecord) for record in records)
+    assert records[0].timestamp <= records[-1].timestamp
+
+
+@pytest.mark.asyncio
+async def test_replay(journal, LightSwitch):
+    first, second = LightSwitch("a"), LightSwitch(2)
+    first.turn_on()
+    second.turn_on()
+    second.break_switch()
+    await TrafficLight("light").go()
+    journal.close()
+
+    assert replay(journal.path) == {"a": "on", 2: "broken", "light": Color.GREEN.value}
+
+
+def test_appends_to_existing_journal(journal, LightSwitch):
+    LightSwitch("a").turn_on()
+    journal.close()
+
+    with TransitionJournal(journal.path, format=journal.format) as reopened:
+        LightSwitch.add_observer(reopened)
+        try:
+            switch = LightSwitch("b")
+            switch.turn_on()
+        finally:
+            LightSwitch.remove_observer(reopened)
+
+    assert replay(journal.path) == {"a": "on", id(switch): "on"}
+    if journal.format == "binary":
+        assert journal.path.read_bytes().count(BINARY_MAGIC) == 1
+
+
+def test_background_thread_flushes_full_batches(journal, LightSwitch):
+    journal.batch_size = 2
+    journal.flush_interval = 60
+    journal.start()
+    with pytest.raises(RuntimeError):
+        journal.start()
+
+    LightSwitch("a").turn_on()
+    LightSwitch("b").turn_on()
+
+    for _ in range(200):
+        if len(list(read_journal(journal.path))) == 2:
+            break
+        time.sleep(0.01)
+    assert replay(journal.path) == {"a": "on", "b": "on"}
+
+
+@pytest.mark.asyncio
+async def test_async_flusher(journal):
+    journal.flush_interval = 0.01
+    task = asyncio.ensure_future(journal.run())
+
+    await TrafficLight("light").go()
+    await asyncio.sleep(0.1)
+    assert replay(journal.path) == {"light": Color.GREEN.value}
+
+    journal.close()
+    await asyncio.wait_for(task, 1)
+
+
+@pytest.mark.asyncio
+async def test_async_flusher_wakes_for_full_batches(journal):
+    journal.batch_size = 1
+    journal.flush_interval = 60
+    task = asyncio.ensure_future(journal.run())
+
+    await TrafficLight("light").go()
+    for _ in range(100):
+        if replay(journal.path):
+            break
+        await asyncio.sleep(0.01)
+    assert replay(journal.path) == {"light": Color.GREEN.value}
+
+    journal.close()
+    await asyncio.wait_for(task, 1)
+
+
+def test_truncated_binary_record_is_ignored(tmp_path, LightSwitch):
+    path = tmp_path / "journal.log"
+    journal = TransitionJournal(path, format="binary", machine_id=lambda m: m.id)
+    LightSwitch.add_observer(journal)
+    try:
+        LightSwitch("a").turn_on()
+        LightSwitch("b").turn_on()
+    finally:
+        LightSwitch.remove_observer(journal)
+        journal.close()
+
+    path.write_bytes(path.read_bytes()[:-3])
+    assert replay(path) == {"a": "on"}
+
+
+def test_invalid_format(tmp_path):
+    with pytest.raises(ValueError):
+        TransitionJournal(tmp_path / "journal.log", format="csv")
+
+
+@pytest.mark.parametrize("format", ["jsonl", "binary"])
+def test_ids_are_written_with_str_when_needed(tmp_path, format, LightSwitch):
+    ids = {}
+    journal = TransitionJournal(
+        tmp_path / "journal.log", format=format, machine_id=ids.__getitem__
+    )
+    journal.start()
+    LightSwitch.add_observer(journal)
+    try:
+        switch = LightSwitch("a")
+        ids[switch] = uuid.UUID(int=1)
+        switch.turn_on()
+    finally:
+        LightSwitch.remove_observer(journal)
+        journal.close()
+
+    assert replay(journal.path) == {str(uuid.UUID(int=1)): "on"}
+    assert journal.dropped == 0
+
+
+class Unprintable:
+    def __str__(self):
+        raise RuntimeError("no str")
+
+
+def test_unencodable_records_are_dropped(journal, LightSwitch):
+    journal.machine_id = lambda machine: machine.id
+    LightSwitch(Unprintable()).turn_on()
+    LightSwitch("b").turn_on()
+    journal.flush()
+
+    assert replay(journal.path) == {"b": "on"}
+    assert journal.dropped == 1
+    assert isinstance(journal.last_error, RuntimeError)
+
+
+def test_failed_writes_are_retried(journal, LightSwitch):
+    file = journal._file
+
+    class FailingFile:
+        closed = False
+
+        def write(self, data):
+            raise OSError("disk full")
+
+    LightSwitch("a").turn_on()
+    journal._file = FailingFile()
+    journal.flush_interval = 0.01
+    journal.start()
+    for _ in range(100):
+        if journal.last_error is not None:
+            break
+        time.sleep(0.01)
+    assert isinstance(journal.last_error, OSError)
+    assert journal._thread.is_alive()
+
+    journal._file = file
+    LightSwitch("b").turn_on()
+    journal.close()
+    assert [record.machine_id for record in read_journal(journal.path)] == ["a", "b"]
@@ -0,0 +1,130 @@
+from concurrent.futures import ThreadPoolExecutor
+import urllib.request
+
+import pytest
+
+from finite_state_machine import transition
+from finite_state_machine.exceptions import (
+    ConditionsNotMet,
+    InvalidStartState,
+    StaleTransition,
+)
+from finite_state_machine.metrics import MetricsCollector
+
+
+@pytest.fixture
+def collector(LightSwitch):
+    collector = MetricsCollector(buckets=(0.1, 1.0))
+    LightSwitch.add_observer(collector)
+    yield collector
+    LightSwitch.remove_observer(collector)
+
+
+def exercise_light_switch(LightSwitch):
+    switch = LightSwitch()
+    switch.turn_on()
+    with pytest.raises(InvalidStartState):
+        switch.turn_on()
+    switch.break_switch()
+
+    switch = LightSwitch()
+    switch.powered = False
+    with pytest.raises(ConditionsNotMet):
+        switch.turn_on()
+
+
+def test_counters(collector, LightSwitch):
+    exercise_light_switch(LightSwitch)
+
+    snapshot = collector.snapshot()
+
+    turn_on = snapshot[("LightSwitch", "turn_on")]
+    assert turn_on[:6] == [3, 1, 1, 1, 0, 0]
+    break_switch = snapshot[("LightSwitch", "break_switch")]
+    assert break_switch[:6] == [1, 0, 0, 0, 1, 1]
+
+
+def test_stale_transitions(collector, LightSwitch):
+    class SafeSwitch(LightSwitch, thread_safe="optimistic"):
+        @transition(source="off", target="on")
+        def turn_on(self):
+            # another thread turns the switch on while this one runs
+            self.state = "on"
+
+    with pytest.raises(StaleTransition):
+        SafeSwitch().turn_on()
+
+    stats = collector.snapshot()[("SafeSwitch", "turn_on")]
+    assert stats[:7] == [1, 0, 0, 0, 0, 0, 1]
+    assert 'reason="stale"} 1' in collector.to_prometheus()
+
+
+def test_prometheus_exposition(collector, LightSwitch):
+    exercise_light_switch(LightSwitch)
+
+    text = collector.to_prometheus()
+
+    labels = 'machine="LightSwitch",transition="turn_on"'
+    assert "# TYPE fsm_transition_attempts_total counter" in text
+    assert f"fsm_transition_attempts_total{{{labels}}} 3" in text
+    assert f"fsm_transition_successes_total{{{labels}}} 1" in text
+    assert (
+        f'fsm_transition_rejections_total{{{labels},reason="invalid_start_state"}} 1'
+        in text
+    )
+    assert (
+        f'fsm_transition_rejections_total{{{labels},reason="conditions_not_met"}} 1'
+        in text
+    )
+    assert "# TYPE fsm_transition_duration_seconds histogram" in text
+    assert f'fsm_transition_duration_seconds_bucket{{{labels},le="0.1"}} 1' in text
+    assert f'fsm_transition_duration_seconds_bucket{{{labels},le="+Inf"}} 1' in text
+    assert f"fsm_transition_duration_seconds_count{{{labels}}} 1" in text
+
+    labels = 'machine="LightSwitch",transition="break_switch"'
+    assert f"fsm_transition_on_error_total{{{labels}}} 1" in text
+    assert text.endswith("\n")
+
+
+def test_counts_from_many_threads_are_merged(collector, LightSwitch):
+    def turn_on_and_off(_):
+        switch = LightSwitch()
+        switch.turn_on()
+
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        list(executor.map(turn_on_and_off, range(1000)))
+
+    stats = collector.snapshot()[("LightSwitch", "turn_on")]
+    assert stats[0] == stats[1] == 1000
+
+
+def test_reset(collector, LightSwitch):
+    exercise_light_switch(LightSwitch)
+
+    collector.reset()
+
+    assert collector.snapshot() == {}
+
+
+def test_write_prometheus(collector, LightSwitch, tmp_path):
+    exercise_light_switch(LightSwitch)
+    path = tmp_path / "fsm.prom"
+
+    collector.write_prometheus(str(path))
+
+    assert path.read_text() == collector.to_prometheus()
+    assert [p.name for p in tmp_path.iterdir()] == ["fsm.prom"]
+
+
+def test_serve_prometheus(collector, LightSwitch):
+    exercise_light_switch(LightSwitch)
+    server = collector.serve_prometheus(port=0)
+    try:
+        port = server.server_address[1]
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    assert body == collector.to_prometheus()
@@ -0,0 +1,162 @@
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.exceptions import ConditionsNotMet, InvalidStartState
+from finite_state_machine.observers import TransitionObserver
+
+
+class RecordingObserver(TransitionObserver):
+    def __init__(self):
+        self.events = []
+
+    def on_start(self, event):
+        self.events.append(("start", event))
+
+    def on_end(self, event):
+        self.events.append(("end", event))
+
+    def on_reject(self, event):
+        self.events.append(("reject", event))
+
+    def on_error(self, event):
+        self.events.append(("error", event))
+
+    @property
+    def kinds(self):
+        return [(kind, event.name) for kind, event in self.events]
+
+
+@pytest.fixture
+def observer(LightSwitch):
+    observer = RecordingObserver()
+
+    class ObservedLightSwitch(LightSwitch):
+        pass
+
+    ObservedLightSwitch.add_observer(observer)
+    observer.machine_class = ObservedLightSwitch
+    yield observer
+    ObservedLightSwitch.remove_observer(observer)
+
+
+def test_successful_transition_events(observer):
+    switch = observer.machine_class()
+
+    assert switch.turn_on() == "on"
+
+    assert observer.kinds == [("start", "turn_on"), ("end", "turn_on")]
+    _, end = observer.events[1]
+    assert end.machine is switch
+    assert end.source == "off"
+    assert end.target == "on"
+    assert end.duration >= 0
+    assert end.error is None
+
+
+@pytest.mark.asyncio
+async def test_events_sent_by_name(observer):
+    switch = observer.machine_class()
+
+    switch.send("turn_on")
+    switch.send("turn_off")
+    await switch.asend("async_turn_on")
+
+    assert observer.kinds == [
+        ("start", "turn_on"),
+        ("end", "turn_on"),
+        ("start", "turn_off"),
+        ("end", "turn_off"),
+        ("start", "async_turn_on"),
+        ("end", "async_turn_on"),
+    ]
+
+
+def test_invalid_start_state_is_rejected(observer):
+    switch = observer.machine_class()
+
+    with pytest.raises(InvalidStartState):
+        switch.turn_off()
+
+    assert observer.kinds == [("start", "turn_off"), ("reject", "turn_off")]
+    assert isinstance(observer.events[1][1].error, InvalidStartState)
+
+
+def test_conditions_not_met_is_rejected(observer):
+    switch = observer.machine_class()
+    switch.powered = False
+
+    outcome = type(switch).turn_on.try_(switch)
+
+    assert not outcome
+    assert observer.kinds == [("start", "turn_on"), ("reject", "turn_on")]
+    assert isinstance(observer.events[1][1].error, ConditionsNotMet)
+
+
+def test_error_with_on_error_state(observer):
+    switch = observer.machine_class()
+    switch.turn_on()
+
+    switch.break_switch()
+
+    assert switch.state == "broken"
+    assert observer.kinds[-2:] == [("start", "break_switch"), ("error", "break_switch")]
+    assert str(observer.events[-1][1].error) == "broken"
+
+
+@pytest.mark.asyncio
+async def test_async_transition_events(observer):
+    switch = observer.machine_class()
+
+    assert await switch.async_turn_on() == "on"
+    with pytest.raises(ValueError, match="async failure"):
+        await switch.async_fail()
+
+    assert observer.kinds == [
+        ("start", "async_turn_on"),
+        ("end", "async_turn_on"),
+        ("start", "async_fail"),
+        ("error", "async_fail"),
+    ]
+    assert switch.state == "on"
+
+
+def test_observers_are_per_class(observer, LightSwitch):
+    switch = LightSwitch()
+
+    switch.turn_on()
+
+    assert observer.events == []
+    assert LightSwitch._fsm_observers == ()
+
+
+def test_global_observer_applies_to_existing_and_new_classes(LightSwitch):
+    observer = RecordingObserver()
+    StateMachine.add_observer(observer)
+    try:
+
+        class Door(StateMachine):
+            def __init__(self):
+                self.state = "closed"
+                super().__init__()
+
+            @transition(source="closed", target="open")
+            def open(self):
+                pass
+
+        LightSwitch().turn_on()
+        Door().open()
+    finally:
+        StateMachine.remove_observer(observer)
+
+    assert observer.kinds == [
+        ("start", "turn_on"),
+        ("end", "turn_on"),
+        ("start", "open"),
+        ("end", "open"),
+    ]
+    assert LightSwitch._fsm_observers == ()
+
+
+def test_removing_unknown_observer_raises(LightSwitch):
+    with pytest.raises(ValueError):
+        LightSwitch.remove_observer(RecordingObserver())
@@ -0,0 +1,101 @@
+from collections import namedtuple
+
+import pytest
+
+from finite_state_machine.exceptions import ConditionsNotMet, InvalidStartState
+from finite_state_machine.pool import StateMachinePool
+from examples.boolean_field import EnableFeatureStateMachine
+from examples.turnstile import Turnstile
+
+Account = namedtuple("Account", "feature bills_outstanding")
+
+
+def test_add_entities_in_initial_state():
+    pool = StateMachinePool(Turnstile)
+
+    first = pool.add()
+    others = pool.extend(3)
+
+    assert first == 0
+    assert list(others) == [1, 2, 3]
+    assert len(pool) == 4
+    assert [view.state for view in pool] == ["close"] * 4
+
+
+def test_views_run_transitions_against_the_pool():
+    pool = StateMachinePool(Turnstile)
+    pool.extend(2)
+
+    pool[1].insert_coin()
+
+    assert pool.state_of(0) == "close"
+    assert pool.state_of(1) == "open"
+
+    pool[1].pass_thru()
+    assert pool[1].state == "close"
+
+    with pytest.raises(InvalidStartState, match="Current state is close"):
+        pool[0].pass_thru()
+
+
+def test_views_are_instances_of_the_machine_class():
+    pool = StateMachinePool(Turnstile)
+    pool.add()
+
+    assert isinstance(pool[0], Turnstile)
+
+
+def test_pool_without_initial_state_requires_state():
+    pool = StateMachinePool(EnableFeatureStateMachine)
+
+    with pytest.raises(ValueError, match="does not define initial_state"):
+        pool.add()
+
+    entity_id = pool.add(state=False)
+    assert pool.state_of(entity_id) is False
+
+
+def test_views_evaluate_conditions():
+    pool = StateMachinePool(EnableFeatureStateMachine)
+    entity_id = pool.add(state=False)
+    view = pool[entity_id]
+    view.account = Account(feature={"enabled": False}, bills_outstanding=[1])
+
+    with pytest.raises(ConditionsNotMet):
+        view.enable_feature()
+
+    view.account = Account(feature={"enabled": False}, bills_outstanding=[])
+    view.enable_feature()
+    assert pool.state_of(entity_id) is True
+
+
+def test_unknown_state_is_rejected():
+    pool = StateMachinePool(Turnstile)
+
+    with pytest.raises(ValueError, match="'jammed' is not a state of Turnstile"):
+        pool.add("jammed")
+
+
+def test_missing_entity_raises_index_error():
+    pool = StateMachinePool(Turnstile)
+
+    with pytest.raises(IndexError):
+        pool[0]
+
+
+def test_memory_usage_is_about_a_byte_per_entity():
+    pool = StateMachinePool(Turnstile)
+    pool.extend(100_000)
+
+    assert pool.memory_usage() < 2 * 100_000
+
+
+def test_pool_works_with_bulk_transitions():
+    pool = StateMachinePool(Turnstile)
+    pool.extend(3)
+    pool[0].insert_coin()
+
+    mask = Turnstile.pass_thru.bulk(pool.codes)
+
+    assert mask == bytes([1, 0, 0])
+    assert pool.state_of(0) == "close"
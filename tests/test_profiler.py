@@ -0,0 +1,78 @@
+import json
+
+from examples import async_turnstile, github_pull_request, turnstile
+from finite_state_machine.profiler import (
+    COLUMNS,
+    format_table,
+    main,
+    profile_workload,
+    random_walk,
+)
+
+
+def test_random_walk_profile():
+    def workload():
+        random_walk(turnstile.Turnstile, steps=200, seed=1)
+
+    rows = profile_workload(turnstile.Turnstile, workload)
+
+    rows = {row["transition"]: row for row in rows}
+    assert set(rows) == {"insert_coin", "pass_thru"}
+    assert sum(row["calls"] for row in rows.values()) == 200
+    for row in rows.values():
+        assert row["calls"] == row["ok"]
+        assert row["cpu_seconds"] >= row["function_seconds"] >= 0
+    assert turnstile.Turnstile._fsm_observers == ()
+
+
+def test_random_walk_counts_rejections_and_errors():
+    def workload():
+        random_walk(async_turnstile.Turnstile, steps=300, seed=2)
+
+    rows = profile_workload(async_turnstile.Turnstile, workload)
+
+    rows = {row["transition"]: row for row in rows}
+    assert rows["error_function"]["errors"] == rows["error_function"]["calls"] > 0
+
+
+def test_random_walk_restarts_in_final_state():
+    def workload():
+        random_walk(github_pull_request.GitHubPullRequest, steps=100, seed=3)
+
+    rows = profile_workload(github_pull_request.GitHubPullRequest, workload)
+
+    rows = {row["transition"]: row for row in rows}
+    assert rows["close_pull_request"]["ok"] > 1
+    # called without the `user` argument
+    assert rows["merge_pull_request"]["errors"] == rows["merge_pull_request"]["calls"]
+
+
+def test_format_table():
+    row = dict.fromkeys(COLUMNS, 0)
+    row.update(transition="approve", cpu_seconds=0.5)
+
+    lines = format_table([row]).splitlines()
+
+    assert lines[0].split() == list(COLUMNS)
+    assert lines[1].split()[:2] == ["approve", "0"]
+    assert "0.500000" in lines[1]
+
+
+def test_main_with_workload_script(tmp_path, capsys):
+    script = tmp_path / "workload.py"
+    script.write_text(
+        "machine = state_machine_class()\n"
+        "for _ in range(10):\n"
+        "    machine.insert_coin()\n"
+        "    machine.pass_thru()\n"
+    )
+
+    main(
+        ["--class", "examples.turnstile:Turnstile", "--workload", str(script), "--json"]
+    )
+
+    rows = json.loads(capsys.readouterr().out)
+    assert {row["transition"]: row["calls"] for row in rows} == {
+        "insert_coin": 10,
+        "pass_thru": 10,
+    }
@@ -0,0 +1,158 @@
+import asyncio
+
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.exceptions import InvalidStartState
+from finite_state_machine.runtime import ActorRuntime
+
+
+class Account(StateMachine):
+    def __init__(self, name=""):
+        self.state = "open"
+        self.name = name
+        self.closed_count = 0
+        self.log = []
+        super().__init__()
+
+    @transition(source="open", target="closed")
+    async def close(self):
+        await asyncio.sleep(0.001)
+        self.closed_count += 1
+        return "closed"
+
+    @transition(source=["open", "closed"], target="open")
+    async def touch(self, value):
+        await asyncio.sleep(0)
+        self.log.append(value)
+        return value
+
+    @transition(source=["open", "closed"], target="open")
+    def sync_touch(self, value):
+        self.log.append(value)
+        return value
+
+
+@pytest.mark.asyncio
+async def test_concurrent_transitions_race_without_runtime():
+    account = Account()
+
+    await asyncio.gather(account.close(), account.close())
+
+    assert account.closed_count == 2
+
+
+@pytest.mark.asyncio
+async def test_events_for_one_machine_are_serialized():
+    account = Account()
+
+    async with ActorRuntime(workers=4) as runtime:
+        results = await asyncio.gather(
+            *[runtime.send(account, "close") for _ in range(5)],
+            return_exceptions=True,
+        )
+
+    assert results[0] == "closed"
+    assert all(isinstance(result, InvalidStartState) for result in results[1:])
+    assert account.closed_count == 1
+
+
+@pytest.mark.asyncio
+async def test_events_keep_order_per_machine():
+    accounts = [Account(str(i)) for i in range(10)]
+
+    async with ActorRuntime(workers=3, batch_size=2) as runtime:
+        for value in range(20):
+            for account in accounts:
+                await runtime.tell(account, "touch", value)
+
+    for account in accounts:
+        assert account.log == list(range(20))
+    stats = runtime.stats()
+    assert stats.processed == 200
+    assert stats.queued == 0
+    assert stats.mailboxes == 0
+    assert stats.max_queue_depth == 20
+
+
+@pytest.mark.asyncio
+async def test_busy_machine_does_not_starve_others():
+    busy = Account("busy")
+    other = Account("other")
+    finished = []
+
+    async with ActorRuntime(workers=1, batch_size=1) as runtime:
+        futures = [await runtime.tell(busy, "touch", i) for i in range(50)]
+        futures[-1].add_done_callback(lambda _: finished.append("busy"))
+        other_future = await runtime.tell(other, "sync_touch", "x")
+        other_future.add_done_callback(lambda _: finished.append("other"))
+
+        assert runtime.queue_depth(busy) == 50
+        assert runtime.stats().mailboxes == 2
+
+    assert finished == ["other", "busy"]
+
+
+@pytest.mark.asyncio
+async def test_max_queued_applies_backpressure():
+    account = Account()
+
+    async with ActorRuntime(workers=1, max_queued=2) as runtime:
+        await runtime.tell(account, "touch", 1)
+        await runtime.tell(account, "touch", 2)
+        third = asyncio.ensure_future(runtime.tell(account, "touch", 3))
+        await asyncio.sleep(0)
+        assert not third.done()
+        assert runtime.stats().queued == 2
+        await third
+
+    assert account.log == [1, 2, 3]
+
+
+@pytest.mark.asyncio
+async def test_stop_cancels_queued_events():
+    account = Account()
+    runtime = ActorRuntime(workers=1)
+    runtime.start()
+    futures = [await runtime.tell(account, "touch", i) for i in range(5)]
+
+    await runtime.stop()
+
+    assert all(future.cancelled() for future in futures)
+    with pytest.raises(RuntimeError):
+        await runtime.tell(account, "touch", 6)
+
+
+@pytest.mark.asyncio
+async def test_transition_raising_cancelled_error_does_not_stop_worker():
+    class Job(StateMachine):
+        def __init__(self):
+            self.state = "idle"
+            super().__init__()
+
+        @transition(source="idle", target="running")
+        async def go(self, waiting_on):
+            await waiting_on
+
+        @transition(source="idle", target="idle")
+        async def back(self):
+            return "back"
+
+    job = Job()
+    waiting_on = asyncio.get_event_loop().create_future()
+    waiting_on.cancel()
+
+    async with ActorRuntime(workers=1) as runtime:
+        with pytest.raises(asyncio.CancelledError):
+            await runtime.send(job, "go", waiting_on)
+        assert await asyncio.wait_for(runtime.send(job, "back"), 1) == "back"
+
+    assert runtime.stats().mailboxes == 0
+
+
+@pytest.mark.parametrize(
+    "kwargs", [{"workers": 0}, {"batch_size": 0}, {"max_queued": 0}]
+)
+def test_invalid_parameters(kwargs):
+    with pytest.raises(ValueError):
+        ActorRuntime(**kwargs)
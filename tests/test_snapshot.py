@@ -0,0 +1,135 @@
+from enum import Enum
+
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.pool import StateMachinePool
+from finite_state_machine.snapshot import Snapshot, save_snapshot
+
+
+class Status(Enum):
+    OPEN = "open"
+    MERGED = "merged"
+    CLOSED = "closed"
+
+
+class PullRequest(StateMachine):
+    initial_state = Status.OPEN
+
+    def __init__(self, number, title=""):
+        self.state = Status.OPEN
+        self.number = number
+        self.title = title
+        super().__init__()
+
+    @transition(source=Status.OPEN, target=Status.MERGED)
+    def merge(self):
+        pass
+
+    @transition(source=Status.OPEN, target=Status.CLOSED)
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def path(tmp_path):
+    return tmp_path / "snapshot.fsm"
+
+
+def make_pull_requests():
+    prs = [PullRequest(number, f"PR {number}") for number in range(10)]
+    prs[3].merge()
+    prs[7].close()
+    return prs
+
+
+def test_round_trip(path):
+    prs = make_pull_requests()
+    save_snapshot(path, prs, attributes=["number", "title"])
+
+    with Snapshot(path, PullRequest) as snapshot:
+        assert len(snapshot) == 10
+        assert snapshot.attributes == ("number", "title")
+        assert list(snapshot.codes) == list(
+            PullRequest.encode_states(pr.state for pr in prs)
+        )
+        assert snapshot.state_of(3) is Status.MERGED
+
+        restored = list(snapshot)
+        assert [pr.state for pr in restored] == [pr.state for pr in prs]
+        assert [pr.number for pr in restored] == list(range(10))
+        assert restored[7].title == "PR 7"
+        assert snapshot[-1].number == 9
+
+        restored[0].close()
+        assert restored[0].state is Status.CLOSED
+
+        with pytest.raises(IndexError):
+            snapshot[10]
+
+
+def test_columns(path):
+    prs = make_pull_requests()
+    for pr in prs:
+        pr.score = pr.number / 2
+    save_snapshot(path, prs, attributes=["number", "score", "title"])
+
+    with Snapshot(path, PullRequest) as snapshot:
+        assert snapshot.header["columns"][0]["typecode"] == "q"
+        assert snapshot.header["columns"][1]["typecode"] == "d"
+        assert snapshot.header["columns"][2]["typecode"] == "json"
+        assert list(snapshot.column("score")) == [number / 2 for number in range(10)]
+        with pytest.raises(KeyError):
+            snapshot.column("missing")
+
+
+def test_states_are_translated_when_codes_change(path):
+    save_snapshot(path, make_pull_requests())
+
+    class ReorderedPullRequest(StateMachine):
+        @transition(source=Status.CLOSED, target=Status.OPEN)
+        def reopen(self):
+            pass
+
+        @transition(source=Status.OPEN, target=Status.MERGED)
+        def merge(self):
+            pass
+
+    with Snapshot(path, ReorderedPullRequest) as snapshot:
+        assert snapshot.state_of(3) is Status.MERGED
+        assert snapshot.state_of(7) is Status.CLOSED
+        assert snapshot[0].state is Status.OPEN
+
+    class UnrelatedMachine(StateMachine):
+        @transition(source="a", target="b")
+        def go(self):
+            pass
+
+    with pytest.raises(ValueError):
+        Snapshot(path, UnrelatedMachine)
+
+
+def test_pool(path):
+    pool = StateMachinePool(PullRequest)
+    pool.extend(1000)
+    pool[10].merge()
+    save_snapshot(path, pool)
+
+    with Snapshot(path, PullRequest) as snapshot:
+        restored = snapshot.to_pool()
+
+    assert len(restored) == 1000
+    assert restored.state_of(10) is Status.MERGED
+    assert restored.codes == pool.codes
+
+    with pytest.raises(ValueError):
+        save_snapshot(path, pool, attributes=["number"])
+
+
+def test_invalid_snapshots(path):
+    with pytest.raises(ValueError):
+        save_snapshot(path, [])
+
+    path.write_bytes(b"not a snapshot")
+    with pytest.raises(ValueError):
+        Snapshot(path, PullRequest)
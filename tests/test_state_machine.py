@@ -1,9 +1,22 @@
+from array import array
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, IntEnum
+import threading
+import time
 
 import pytest
 
 from finite_state_machine import StateMachine, transition
-from finite_state_machine.exceptions import ConditionsNotMet
+from finite_state_machine.exceptions import (
+    ConditionsNotMet,
+    InvalidStartState,
+    StaleTransition,
+    TransitionNotAllowed,
+    TransitionTimeout,
+)
+from finite_state_machine.observers import TransitionObserver
+from finite_state_machine.state_machine import _state_lock
 
 
 def test_state_machine_requires_state_instance_variable():
@@ -18,6 +31,81 @@ def test_state_machine_requires_state_instance_variable():
         LightSwitch()
 
 
+@pytest.mark.parametrize(
+    "exception_class",
+    [InvalidStartState, ConditionsNotMet, StaleTransition, TransitionTimeout],
+)
+def test_exceptions_raised_with_a_message(exception_class):
+    assert str(exception_class("custom message")) == "custom message"
+    assert str(exception_class()) == ""
+    with pytest.raises(exception_class, match="custom message"):
+        raise exception_class("custom message")
+
+
+class TestSlots:
+    class Turnstile(StateMachine):
+        __slots__ = ("state", "coins")
+
+        def __init__(self):
+            self.state = "close"
+            self.coins = 0
+            super().__init__()
+
+        @transition(source=["close", "open"], target="open")
+        def insert_coin(self):
+            self.coins += 1
+
+    def test_slotted_state_machine_has_no_instance_dict(self):
+        turnstile = self.Turnstile()
+
+        assert not hasattr(turnstile, "__dict__")
+
+    def test_transitions_work_on_slotted_state_machine(self):
+        turnstile = self.Turnstile()
+
+        turnstile.insert_coin()
+
+        assert turnstile.state == "open"
+        assert turnstile.coins == 1
+
+    def test_slotted_state_machine_requires_state_slot(self):
+        class LightSwitch(StateMachine):
+            __slots__ = ("brightness",)
+
+        with pytest.raises(ValueError, match="Need to declare state in __slots__"):
+            LightSwitch()
+
+    def test_slotted_base_can_leave_state_to_subclasses(self):
+        class Base(StateMachine):
+            __slots__ = ()
+
+            @transition(source="off", target="on")
+            def turn_on(self):
+                pass
+
+        class Impl(Base):
+            __slots__ = ("state",)
+
+            def __init__(self):
+                self.state = "off"
+                super().__init__()
+
+        switch = Impl()
+        switch.turn_on()
+
+        assert switch.state == "on"
+        assert not hasattr(switch, "__dict__")
+
+    def test_subclass_without_slots_still_has_instance_dict(self):
+        class CountingTurnstile(self.Turnstile):
+            pass
+
+        turnstile = CountingTurnstile()
+        turnstile.label = "north"
+
+        assert turnstile.__dict__ == {"label": "north"}
+
+
 class TestSourceTargetParameterTypes:
     class StateEnum(Enum):
         SOME_STATE = "some_state"
@@ -232,3 +320,1089 @@ class TestExceptionStateHandling:
         # Act / Assert
         with pytest.raises(ValueError, match="expected error"):
             switch.turn_on()
+
+
+class TestTransitionTable:
+    class Turnstile(StateMachine):
+        def __init__(self):
+            self.state = "close"
+            super().__init__()
+
+        @transition(source=["close", "open"], target="open")
+        def insert_coin(self):
+            pass
+
+        @transition(source="open", target="close")
+        def pass_thru(self):
+            pass
+
+    def test_table_is_built_per_class(self):
+        table = self.Turnstile._fsm_table
+
+        assert set(table) == {
+            ("close", "insert_coin"),
+            ("open", "insert_coin"),
+            ("open", "pass_thru"),
+        }
+        assert table[("open", "pass_thru")] is self.Turnstile.pass_thru._fsm
+        assert set(self.Turnstile._fsm_transitions) == {"insert_coin", "pass_thru"}
+
+    def test_table_is_read_only(self):
+        with pytest.raises(TypeError):
+            self.Turnstile._fsm_table[("close", "pass_thru")] = None
+
+    def test_subclass_inherits_and_overrides_transitions(self):
+        class LockedTurnstile(self.Turnstile):
+            def insert_coin(self):
+                pass
+
+            @transition(source="close", target="locked")
+            def lock(self):
+                pass
+
+        table = LockedTurnstile._fsm_table
+        assert ("close", "insert_coin") not in table
+        assert ("open", "pass_thru") in table
+        assert ("close", "lock") in table
+
+        turnstile = LockedTurnstile()
+        turnstile.lock()
+        assert turnstile.state == "locked"
+
+    def test_transition_not_in_table_is_rejected(self):
+        turnstile = self.Turnstile()
+
+        with pytest.raises(InvalidStartState, match="Current state is close"):
+            turnstile.pass_thru()
+
+
+class TestTransitionArguments:
+    def condition(self, *args, **kwargs):
+        return True
+
+    @pytest.mark.parametrize("conditions", [None, [condition]])
+    @pytest.mark.parametrize(
+        "args,kwargs",
+        [
+            ((), {}),
+            ((1,), {}),
+            ((1, 2), {}),
+            ((1,), {"b": 2}),
+        ],
+    )
+    def test_arguments_are_passed_through(self, conditions, args, kwargs):
+        class Counter(StateMachine):
+            def __init__(self):
+                self.state = "idle"
+                super().__init__()
+
+            @transition(source="idle", target="done", conditions=conditions)
+            def finish(self, *args, **kwargs):
+                return args, kwargs
+
+        counter = Counter()
+
+        result = counter.finish(*args, **kwargs)
+
+        assert result == (args, kwargs)
+        assert counter.state == "done"
+
+
+class TestBulkTransitions:
+    class Door(StateMachine):
+        def __init__(self, state="closed"):
+            self.state = state
+            super().__init__()
+
+        @transition(source=["closed", "ajar"], target="open")
+        def open(self):
+            raise AssertionError("transition function is not called in bulk")
+
+        @transition(source="open", target="closed", conditions=[lambda self: True])
+        def close(self):
+            pass
+
+    def test_state_encoding(self):
+        codes = self.Door.encode_states(["closed", "ajar", "open"])
+
+        assert codes.typecode == "B"
+        assert self.Door.decode_states(codes) == ["closed", "ajar", "open"]
+
+    def test_encoding_unknown_state_raises(self):
+        with pytest.raises(ValueError, match="'locked' is not a state of Door"):
+            self.Door.encode_states(["locked"])
+
+    @pytest.mark.parametrize("typecode", ["B", "H"])
+    def test_bulk_over_state_codes(self, typecode):
+        codes = array(
+            typecode, self.Door.encode_states(["closed", "open", "ajar", "open"])
+        )
+
+        mask = self.Door.open.bulk(codes)
+
+        assert mask == bytes([1, 0, 1, 0])
+        assert self.Door.decode_states(codes) == ["open"] * 4
+
+    def test_bulk_over_machines(self):
+        doors = [self.Door("closed"), self.Door("open"), self.Door("ajar")]
+
+        mask = self.Door.open.bulk(doors)
+
+        assert mask == bytes([1, 0, 1])
+        assert [door.state for door in doors] == ["open", "open", "open"]
+
+    def test_bulk_refuses_transitions_with_conditions(self):
+        with pytest.raises(ValueError, match="close has conditions"):
+            self.Door.close.bulk([self.Door("open")])
+
+    def test_bulk_over_observed_machines(self):
+        events = []
+
+        class Recorder(TransitionObserver):
+            def on_end(self, event):
+                events.append(("end", event.source, event.machine.state))
+
+            def on_reject(self, event):
+                events.append(("reject", type(event.error)))
+
+        class ObservedDoor(self.Door):
+            pass
+
+        class ThreadSafeDoor(self.Door, thread_safe=True):
+            pass
+
+        recorder = Recorder()
+        ObservedDoor.add_observer(recorder)
+        ThreadSafeDoor.add_observer(recorder)
+        doors = [ObservedDoor("closed"), ObservedDoor("open"), ThreadSafeDoor("ajar")]
+
+        mask = self.Door.open.bulk(doors)
+
+        assert mask == bytes([1, 0, 1])
+        assert [door.state for door in doors] == ["open", "open", "open"]
+        assert events == [
+            ("end", "closed", "open"),
+            ("reject", InvalidStartState),
+            ("end", "ajar", "open"),
+        ]
+
+    def test_subclass_keeps_state_codes(self):
+        class LockableDoor(self.Door):
+            @transition(source="closed", target="locked")
+            def lock(self):
+                pass
+
+        assert LockableDoor._fsm_states[: len(self.Door._fsm_states)] == (
+            self.Door._fsm_states
+        )
+        codes = LockableDoor.encode_states(["closed", "locked"])
+
+        mask = LockableDoor.open.bulk(codes)
+
+        assert mask == bytes([1, 0])
+        assert LockableDoor.decode_states(codes) == ["open", "locked"]
+
+
+class TestNonRaisingTransitions:
+    class LightSwitch(StateMachine):
+        def __init__(self):
+            self.state = "off"
+            self.powered = True
+            super().__init__()
+
+        def is_powered(self):
+            return self.powered
+
+        @transition(source="off", target="on", conditions=[is_powered])
+        def turn_on(self):
+            return "light on"
+
+        @transition(source="on", target="off")
+        def turn_off(self):
+            pass
+
+        @transition(source="off", target="on", conditions=[is_powered])
+        async def async_turn_on(self):
+            return "light on"
+
+    def test_can(self):
+        switch = self.LightSwitch()
+
+        assert self.LightSwitch.turn_on.can(switch) is True
+        assert switch.turn_off.can(switch) is False
+
+        switch.powered = False
+        assert self.LightSwitch.turn_on.can(switch) is False
+        assert switch.state == "off"
+
+    def test_try_successful_transition(self):
+        switch = self.LightSwitch()
+
+        outcome = self.LightSwitch.turn_on.try_(switch)
+
+        assert outcome
+        assert outcome.result == "light on"
+        assert outcome.error is None
+        assert switch.state == "on"
+
+    def test_try_invalid_start_state(self):
+        switch = self.LightSwitch()
+
+        outcome = self.LightSwitch.turn_off.try_(switch)
+
+        assert not outcome
+        assert isinstance(outcome.error, InvalidStartState)
+        assert str(outcome.error) == (
+            "Current state is off. turn_off allows transitions from ['on']."
+        )
+        assert switch.state == "off"
+
+    def test_try_conditions_not_met(self):
+        switch = self.LightSwitch()
+        switch.powered = False
+
+        outcome = self.LightSwitch.turn_on.try_(switch)
+
+        assert not outcome
+        assert isinstance(outcome.error, ConditionsNotMet)
+        assert "is_powered" in str(outcome.error)
+        assert switch.state == "off"
+
+    @pytest.mark.parametrize("observed", [False, True])
+    def test_try_raises_rejections_of_other_transitions(self, observed):
+        class Room(StateMachine):
+            def __init__(self, switch):
+                self.state = "dark"
+                self.switch = switch
+                super().__init__()
+
+            @transition(source="dark", target="lit")
+            def light(self):
+                self.switch.turn_off()
+
+        if observed:
+            Room.add_observer(TransitionObserver())
+        room = Room(self.LightSwitch())
+
+        with pytest.raises(InvalidStartState, match="turn_off"):
+            Room.light.try_(room)
+        assert room.state == "dark"
+
+    @pytest.mark.asyncio
+    async def test_async_can_and_try(self):
+        switch = self.LightSwitch()
+        switch.powered = False
+
+        assert await self.LightSwitch.async_turn_on.can(switch) is False
+        outcome = await self.LightSwitch.async_turn_on.try_(switch)
+        assert isinstance(outcome.error, ConditionsNotMet)
+
+        switch.powered = True
+        outcome = await self.LightSwitch.async_turn_on.try_(switch)
+        assert outcome.result == "light on"
+        assert switch.state == "on"
+
+
+class TestAvailableTransitions:
+    class Door(StateMachine):
+        def __init__(self):
+            self.state = "closed"
+            self.locked = False
+            super().__init__()
+
+        def is_unlocked(self):
+            return not self.locked
+
+        @transition(source="closed", target="open", conditions=[is_unlocked])
+        def open(self):
+            pass
+
+        @transition(source="open", target="closed")
+        def close(self):
+            pass
+
+        @transition(source=["closed", "open"], target="broken")
+        def kick(self):
+            pass
+
+    def test_available_transitions_from_current_state(self):
+        door = self.Door()
+
+        names = [details.name for details in door.available_transitions()]
+        assert names == ["open", "kick"]
+
+        door.open()
+        names = [details.name for details in door.available_transitions()]
+        assert names == ["close", "kick"]
+
+    def test_no_transitions_from_final_state(self):
+        door = self.Door()
+        door.kick()
+
+        assert door.available_transitions() == ()
+
+    def test_available_transitions_checking_conditions(self):
+        door = self.Door()
+        door.locked = True
+
+        assert len(door.available_transitions()) == 2
+        names = [
+            details.name
+            for details in door.available_transitions(check_conditions=True)
+        ]
+        assert names == ["kick"]
+
+    def test_checking_async_conditions_raises(self):
+        async def is_unlocked(door):
+            return True
+
+        class Door(StateMachine):
+            def __init__(self):
+                self.state = "closed"
+                super().__init__()
+
+            @transition(source="closed", target="open", conditions=[is_unlocked])
+            async def open(self):
+                pass
+
+        with pytest.raises(TypeError, match="open has async conditions"):
+            Door().available_transitions(check_conditions=True)
+
+
+class TestConditionsMode:
+    def test_conditions_mode_is_invalid(self):
+        with pytest.raises(ValueError, match="conditions_mode must be one of"):
+
+            @transition(source="here", target="there", conditions_mode="some")
+            def state_transition(instance):
+                pass
+
+    @pytest.mark.parametrize("is_async", [False, True])
+    @pytest.mark.parametrize(
+        "conditions_mode,expected_calls,expected_message",
+        [
+            ("all", ["first", "second"], "first_condition, second_condition"),
+            ("fail_fast", ["first"], "first_condition$"),
+            ("adaptive", ["first"], "first_condition$"),
+        ],
+    )
+    @pytest.mark.asyncio
+    async def test_conditions_evaluated(
+        self, is_async, conditions_mode, expected_calls, expected_message
+    ):
+        calls = []
+
+        def first_condition(machine):
+            calls.append("first")
+            return False
+
+        def second_condition(machine):
+            calls.append("second")
+            return False
+
+        class LightSwitch(StateMachine):
+            def __init__(self):
+                self.state = "off"
+                super().__init__()
+
+            @transition(
+                source="off",
+                target="on",
+                conditions=[first_condition, second_condition],
+                conditions_mode=conditions_mode,
+            )
+            def turn_on(self):
+                pass
+
+            @transition(
+                source="off",
+                target="on",
+                conditions=[first_condition, second_condition],
+                conditions_mode=conditions_mode,
+            )
+            async def async_turn_on(self):
+                pass
+
+        switch = LightSwitch()
+
+        with pytest.raises(ConditionsNotMet, match=expected_message):
+            if is_async:
+                await switch.async_turn_on()
+            else:
+                switch.turn_on()
+
+        assert calls == expected_calls
+        assert switch.state == "off"
+
+
+class TestSendEvents:
+    @staticmethod
+    def is_admin(machine, user):
+        return user == "admin"
+
+    @staticmethod
+    def is_approved(machine, user):
+        return machine.approvals > 0
+
+    @pytest.fixture
+    def PullRequest(self):
+        is_admin = self.is_admin
+        is_approved = self.is_approved
+
+        class PullRequest(StateMachine):
+            def __init__(self):
+                self.state = "opened"
+                self.approvals = 0
+                super().__init__()
+
+            @transition(source="opened", target="opened")
+            def approve(self):
+                self.approvals += 1
+                return self.approvals
+
+            @transition(
+                source="opened",
+                target="merged",
+                conditions=[is_approved],
+                event="merge",
+            )
+            def merge_approved(self, user):
+                return "approved"
+
+            @transition(
+                source="opened",
+                target="merged",
+                conditions=[is_admin],
+                event="merge",
+                priority=1,
+            )
+            def merge_as_admin(self, user):
+                return "admin"
+
+            @transition(source="merged", target="reverted", event="revert")
+            async def revert(self):
+                return "reverted"
+
+        return PullRequest
+
+    def test_send_defaults_to_transition_name(self, PullRequest):
+        pr = PullRequest()
+
+        assert pr.send("approve") == 1
+        assert pr.send("approve") == 2
+        assert pr.state == "opened"
+
+    def test_highest_priority_transition_wins(self, PullRequest):
+        pr = PullRequest()
+        pr.approve()
+
+        assert pr.send("merge", "admin") == "admin"
+        assert pr.state == "merged"
+
+    def test_falls_back_to_next_transition(self, PullRequest):
+        pr = PullRequest()
+        pr.approve()
+
+        assert pr.send("merge", user="someone") == "approved"
+        assert pr.state == "merged"
+
+    def test_conditions_not_met_lists_every_transition_tried(self, PullRequest):
+        pr = PullRequest()
+
+        with pytest.raises(ConditionsNotMet) as excinfo:
+            pr.send("merge", "someone")
+
+        assert excinfo.value.conditions == [self.is_admin, self.is_approved]
+        assert pr.state == "opened"
+
+    def test_event_not_allowed_from_current_state(self, PullRequest):
+        pr = PullRequest()
+
+        with pytest.raises(InvalidStartState) as excinfo:
+            pr.send("revert")
+
+        assert excinfo.value.state == "opened"
+        assert excinfo.value.source == ["merged"]
+
+    def test_unknown_event(self, PullRequest):
+        with pytest.raises(ValueError, match="no transitions for close"):
+            PullRequest().send("close")
+
+    def test_send_async_event_raises(self, PullRequest):
+        pr = PullRequest()
+        pr.state = "merged"
+
+        with pytest.raises(TypeError, match="use `asend`"):
+            pr.send("revert")
+
+    @pytest.mark.asyncio
+    async def test_asend(self, PullRequest):
+        pr = PullRequest()
+        pr.approve()
+
+        assert await pr.asend("merge", "someone") == "approved"
+        assert await pr.asend("revert") == "reverted"
+        assert pr.state == "reverted"
+
+    @pytest.mark.asyncio
+    async def test_state_changed_while_trying_transitions(self):
+        async def is_ready(machine):
+            await asyncio.sleep(0.01)
+            return False
+
+        class Job(StateMachine):
+            def __init__(self):
+                self.state = "queued"
+                super().__init__()
+
+            @transition(source="queued", target="running", conditions=[is_ready])
+            async def start_when_ready(self):
+                pass
+
+            @transition(source="queued", target="running", event="start_when_ready")
+            async def force_start(self):
+                pass
+
+            @transition(source="queued", target="cancelled")
+            async def cancel(self):
+                pass
+
+        job = Job()
+        results = await asyncio.gather(
+            job.asend("start_when_ready"), job.cancel(), return_exceptions=True
+        )
+
+        assert isinstance(results[0], InvalidStartState)
+        assert job.state == "cancelled"
+
+    def test_subclass_overrides_event(self, PullRequest):
+        class NoAdminMerge(PullRequest):
+            merge_as_admin = None
+
+        pr = NoAdminMerge()
+        with pytest.raises(ConditionsNotMet) as excinfo:
+            pr.send("merge", "admin")
+
+        assert excinfo.value.conditions == [self.is_approved]
+
+    @pytest.mark.parametrize("kwargs", [{"event": 1}, {"priority": "high"}])
+    def test_invalid_event_parameters(self, kwargs):
+        with pytest.raises(ValueError):
+            transition(source="off", target="on", **kwargs)
+
+
+class TestThreadSafety:
+    def make_door(self, thread_safe=None):
+        options = {} if thread_safe is None else {"thread_safe": thread_safe}
+
+        class Door(StateMachine, **options):
+            def __init__(self):
+                self.state = "open"
+                self.closed_count = 0
+                super().__init__()
+
+            @transition(source="open", target="closed")
+            def close(self, barrier=None):
+                if barrier is not None:
+                    barrier.wait()
+                time.sleep(0.01)
+                self.closed_count += 1
+
+            @transition(source="open", target="closed")
+            async def async_close(self):
+                await asyncio.sleep(0.01)
+                self.closed_count += 1
+
+        return Door
+
+    @staticmethod
+    def close_from_threads(door, threads=4, barrier=None):
+        def close():
+            try:
+                door.close(barrier)
+                return "closed"
+            except TransitionNotAllowed as error:
+                return type(error).__name__
+
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            futures = [executor.submit(close) for _ in range(threads)]
+        return sorted(future.result() for future in futures)
+
+    def test_threads_can_double_transition_by_default(self):
+        door = self.make_door()()
+
+        self.close_from_threads(door, barrier=threading.Barrier(4))
+
+        assert door.closed_count == 4
+
+    def test_lock_serializes_transitions(self):
+        door = self.make_door(thread_safe=True)()
+
+        results = self.close_from_threads(door)
+
+        assert results == ["InvalidStartState"] * 3 + ["closed"]
+        assert door.closed_count == 1
+
+    def test_machines_sharing_a_lock_stripe_do_not_deadlock(self):
+        class Relay(StateMachine, thread_safe=True):
+            def __init__(self):
+                self.state = "idle"
+                self.next = None
+                super().__init__()
+
+            @transition(source="idle", target="done")
+            def forward(self, barrier=None):
+                if barrier is not None:
+                    barrier.wait(timeout=5)
+                    self.next.forward()
+
+        # two unrelated pairs whose lock stripes cross: first_a shares a
+        # stripe with second_b, and first_b with second_a
+        relays = {}
+        while True:
+            relay = Relay()
+            stripe = _state_lock(relay)
+            relays.setdefault(stripe, []).append(relay)
+            stripes = [group for group in relays.values() if len(group) >= 2]
+            if len(stripes) >= 2:
+                break
+        (first_a, second_b), (first_b, second_a) = [group[:2] for group in stripes]
+        first_a.next, second_a.next = first_b, second_b
+
+        barrier = threading.Barrier(2)
+        threads = [
+            threading.Thread(target=relay.forward, args=(barrier,), daemon=True)
+            for relay in (first_a, second_a)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        assert not any(thread.is_alive() for thread in threads)
+
+        assert {relay.state for relay in (first_a, first_b, second_a, second_b)} == {
+            "done"
+        }
+
+    def test_nested_transitions_on_the_same_machine(self):
+        class Counter(StateMachine, thread_safe=True):
+            def __init__(self):
+                self.state = "idle"
+                super().__init__()
+
+            @transition(source="idle", target="counting")
+            def start(self):
+                assert self.compare_and_set_state("idle", "idle")
+
+        counter = Counter()
+        counter.start()
+
+        assert counter.state == "counting"
+
+    def test_optimistic_rejects_stale_transitions(self):
+        door = self.make_door(thread_safe="optimistic")()
+
+        results = self.close_from_threads(door, barrier=threading.Barrier(4))
+
+        assert results == ["StaleTransition"] * 3 + ["closed"]
+        assert door.state == "closed"
+
+    @pytest.mark.parametrize("thread_safe", [True, "optimistic"])
+    @pytest.mark.asyncio
+    async def test_async_transitions_are_optimistic(self, thread_safe):
+        door = self.make_door(thread_safe=thread_safe)()
+
+        results = await asyncio.gather(
+            door.async_close(), door.async_close(), return_exceptions=True
+        )
+
+        assert results[0] is None
+        assert isinstance(results[1], StaleTransition)
+        assert results[1].start_state == "open"
+        assert str(results[1]) == (
+            "State changed from open to closed while async_close was running."
+        )
+
+    def test_option_is_inherited(self):
+        Door = self.make_door(thread_safe=True)
+
+        class SlidingDoor(Door):
+            pass
+
+        assert SlidingDoor._fsm_thread_safe is True
+        assert SlidingDoor._fsm_slow_path is True
+
+    def test_compare_and_set_state(self):
+        door = self.make_door()()
+
+        assert not door.compare_and_set_state("closed", "locked")
+        assert door.state == "open"
+        assert door.compare_and_set_state("open", "closed")
+        assert door.state == "closed"
+
+    def test_invalid_option(self):
+        with pytest.raises(ValueError, match="thread_safe"):
+            self.make_door(thread_safe="yes")
+
+
+class TestOffloadedTransitions:
+    executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="fsm-test")
+
+    def make_report(self):
+        def has_data(machine, seconds=0.0):
+            return machine.has_data
+
+        class Report(StateMachine, executor=self.executor):
+            def __init__(self):
+                self.state = "draft"
+                self.has_data = True
+                self.thread_name = None
+                super().__init__()
+
+            @transition(source="draft", target="rendered", conditions=[has_data])
+            def render(self, seconds=0.0):
+                time.sleep(seconds)
+                self.thread_name = threading.current_thread().name
+                return "rendered"
+
+            @transition(source="draft", target="published", on_error="failed")
+            def publish(self):
+                raise RuntimeError("printer on fire")
+
+            @transition(source="draft", target="archived")
+            async def archive(self):
+                return "archived"
+
+        return Report
+
+    @pytest.mark.asyncio
+    async def test_function_runs_in_executor_without_blocking_loop(self):
+        report = self.make_report()()
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.005)
+                ticks += 1
+
+        ticking = asyncio.ensure_future(ticker())
+        result = await report.arun("render", seconds=0.05)
+        ticking.cancel()
+
+        assert result == "rendered"
+        assert report.state == "rendered"
+        assert report.thread_name.startswith("fsm-test")
+        assert ticks > 2
+
+    @pytest.mark.asyncio
+    async def test_checks_run_before_offloading(self):
+        report = self.make_report()()
+        report.has_data = False
+
+        with pytest.raises(ConditionsNotMet):
+            await type(report).render.arun(report)
+        assert report.thread_name is None
+
+        report.state = "rendered"
+        with pytest.raises(InvalidStartState):
+            await report.arun("render")
+
+    @pytest.mark.asyncio
+    async def test_on_error_state(self):
+        report = self.make_report()()
+
+        assert await report.arun("publish") is None
+        assert report.state == "failed"
+
+    @pytest.mark.asyncio
+    async def test_state_changed_while_running(self):
+        report = self.make_report()()
+
+        running = asyncio.ensure_future(report.arun("render", seconds=0.05))
+        await asyncio.sleep(0.01)
+        await report.archive()
+
+        with pytest.raises(StaleTransition):
+            await running
+        assert report.state == "archived"
+
+    @pytest.mark.asyncio
+    async def test_async_transitions_are_awaited(self):
+        report = self.make_report()()
+
+        assert await report.arun("archive") == "archived"
+
+    @pytest.mark.asyncio
+    async def test_unknown_transition(self):
+        with pytest.raises(ValueError, match="no transition approve"):
+            await self.make_report()().arun("approve")
+
+
+class TestTransitionTimeout:
+    @pytest.fixture
+    def Download(self):
+        async def server_is_up(machine, seconds=0):
+            await asyncio.sleep(machine.condition_seconds)
+            return True
+
+        class Download(StateMachine):
+            def __init__(self):
+                self.state = "queued"
+                self.condition_seconds = 0
+                self.cancelled = False
+                super().__init__()
+
+            @transition(
+                source="queued",
+                target="done",
+                conditions=[server_is_up],
+                on_error="failed",
+                timeout=0.05,
+            )
+            async def fetch(self, seconds=0):
+                try:
+                    await asyncio.sleep(seconds)
+                except asyncio.CancelledError:
+                    self.cancelled = True
+                    raise
+                return "fetched"
+
+            @transition(source="queued", target="done", timeout=0.05)
+            async def fetch_or_raise(self, seconds=0):
+                await asyncio.sleep(seconds)
+                return "fetched"
+
+        return Download
+
+    @pytest.mark.asyncio
+    async def test_finishes_in_time(self, Download):
+        download = Download()
+
+        assert await download.fetch() == "fetched"
+        assert download.state == "done"
+
+    @pytest.mark.asyncio
+    async def test_timeout_moves_to_on_error_state(self, Download):
+        download = Download()
+
+        assert await download.fetch(seconds=1) is None
+        assert download.state == "failed"
+        assert download.cancelled
+
+    @pytest.mark.asyncio
+    async def test_timeout_includes_conditions(self, Download):
+        download = Download()
+        download.condition_seconds = 1
+
+        assert await download.fetch() is None
+        assert download.state == "failed"
+        assert not download.cancelled
+
+    @pytest.mark.asyncio
+    async def test_timeout_without_on_error_raises(self, Download):
+        download = Download()
+
+        with pytest.raises(TransitionTimeout) as excinfo:
+            await download.fetch_or_raise(seconds=1)
+
+        assert str(excinfo.value) == "fetch_or_raise did not finish within 0.05s."
+        assert isinstance(excinfo.value, TimeoutError)
+        assert download.state == "queued"
+
+    @pytest.mark.asyncio
+    async def test_try_and_send(self, Download):
+        download = Download()
+        with pytest.raises(TransitionTimeout):
+            await Download.fetch_or_raise.try_(download, seconds=1)
+
+        outcome = await Download.fetch.try_(download, seconds=1)
+        assert outcome.ok
+        assert download.state == "failed"
+
+        download = Download()
+        with pytest.raises(TransitionTimeout):
+            await download.asend("fetch_or_raise", seconds=1)
+
+    @pytest.mark.asyncio
+    async def test_observers_get_error_event(self, Download):
+        events = []
+
+        class Recorder(TransitionObserver):
+            def on_start(self, event):
+                events.append(("start", None))
+
+            def on_error(self, event):
+                events.append(("error", type(event.error)))
+
+        recorder = Recorder()
+        Download.add_observer(recorder)
+
+        with pytest.raises(TransitionTimeout):
+            await Download().fetch_or_raise(seconds=1)
+
+        assert events == [("start", None), ("error", TransitionTimeout)]
+
+        events.clear()
+        download = Download()
+        download.condition_seconds = 1
+        try:
+            assert await download.fetch() is None
+        finally:
+            Download.remove_observer(recorder)
+
+        assert download.state == "failed"
+        assert events == [("start", None), ("error", TransitionTimeout)]
+
+    @pytest.mark.parametrize("timeout", [0, -1, "1", True])
+    def test_invalid_timeout(self, timeout):
+        with pytest.raises(ValueError):
+            transition(source="a", target="b", timeout=timeout)
+
+    def test_timeout_requires_async_transition(self):
+        with pytest.raises(ValueError, match="async"):
+
+            @transition(source="a", target="b", timeout=1)
+            def sync_transition(self):
+                pass
+
+
+class TestChangeTracking:
+    @pytest.fixture
+    def Order(self):
+        class Order(StateMachine, track_changes=True):
+            def __init__(self):
+                self.state = "new"
+                super().__init__()
+
+            @transition(source="new", target="paid")
+            def pay(self):
+                pass
+
+            @transition(source="paid", target="new")
+            def refund(self):
+                pass
+
+        return Order
+
+    def test_changed_machines(self, Order):
+        orders = [Order() for _ in range(3)]
+        assert Order.changed_machines() == []
+
+        orders[1].pay()
+
+        assert Order.changed_machines() == [orders[1]]
+        assert Order.changeset() == [(orders[1], "new", "paid")]
+
+    def test_changing_back_is_not_a_change(self, Order):
+        order = Order()
+        order.pay()
+        order.refund()
+
+        assert Order.changed_machines() == []
+
+    def test_checkpoint(self, Order):
+        first, second = Order(), Order()
+        first.pay()
+        second.pay()
+
+        Order.checkpoint([first])
+        assert Order.changeset() == [(second, "new", "paid")]
+
+        first.refund()
+        assert Order.changeset() == [(second, "new", "paid"), (first, "paid", "new")]
+        Order.checkpoint()
+        assert Order.changed_machines() == []
+
+    def test_subclasses_share_registry(self, Order):
+        class RushOrder(Order):
+            pass
+
+        order, rush_order = Order(), RushOrder()
+        order.pay()
+        rush_order.pay()
+
+        assert Order.changed_machines() == [order, rush_order]
+        assert RushOrder.changed_machines() == [rush_order]
+        with pytest.raises(ValueError):
+
+            class UntrackedOrder(Order, track_changes=False):
+                pass
+
+    def test_slots(self):
+        class Order(StateMachine, track_changes=True):
+            __slots__ = ("state",)
+
+            def __init__(self):
+                self.state = "new"
+                super().__init__()
+
+            @transition(source="new", target="paid")
+            def pay(self):
+                pass
+
+        order = Order()
+        order.pay()
+
+        assert order.state == "paid"
+        assert Order.changeset() == [(order, "new", "paid")]
+
+    def test_subclass_redeclaring_state_is_tracked(self, Order):
+        class SlottedOrder(Order):
+            __slots__ = ("state",)
+
+        class PropertyOrder(Order):
+            @property
+            def state(self):
+                return self.status
+
+            @state.setter
+            def state(self, state):
+                self.status = state
+
+        slotted, with_property = SlottedOrder(), PropertyOrder()
+        slotted.pay()
+        with_property.pay()
+
+        assert with_property.status == "paid"
+        assert Order.changeset() == [
+            (slotted, "new", "paid"),
+            (with_property, "new", "paid"),
+        ]
+
+    def test_class_level_default_state(self, Order):
+        class Draft(StateMachine, track_changes=True):
+            state = "new"
+
+            @transition(source="new", target="paid")
+            def pay(self):
+                pass
+
+        class Quote(Order):
+            state = "quoted"
+
+            def __init__(self):
+                StateMachine.__init__(self)
+
+            @transition(source="quoted", target="new")
+            def accept(self):
+                pass
+
+        draft, quote = Draft(), Quote()
+        assert Draft.changed_machines() == []
+        assert quote.state == "quoted"
+
+        draft.pay()
+        quote.accept()
+
+        assert Draft.changeset() == [(draft, "new", "paid")]
+        assert Order.changeset() == [(quote, "quoted", "new")]
+
+    def test_requires_option(self):
+        class Order(StateMachine):
+            def __init__(self):
+                self.state = "new"
+                super().__init__()
+
+        with pytest.raises(ValueError, match="does not track changes"):
+            Order.changed_machines()
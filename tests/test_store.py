@@ -0,0 +1,169 @@
+from enum import Enum
+
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.exceptions import VersionConflict
+from finite_state_machine.store import SQLiteStateStore, StateStore
+
+
+class Status(Enum):
+    OPEN = "open"
+    MERGED = "merged"
+
+
+class PullRequest(StateMachine):
+    def __init__(self, id):
+        self.id = id
+        self.state = Status.OPEN
+        super().__init__()
+
+    @transition(source=Status.OPEN, target=Status.MERGED)
+    def merge(self):
+        pass
+
+    @transition(source=Status.MERGED, target=Status.OPEN)
+    def reopen(self):
+        pass
+
+
+@pytest.fixture
+def database(tmp_path):
+    return str(tmp_path / "states.db")
+
+
+@pytest.fixture
+def store(database):
+    store = SQLiteStateStore(database)
+    yield store
+    store.close()
+
+
+def test_new_machines_are_inserted(store):
+    with store.unit_of_work() as unit_of_work:
+        prs = unit_of_work.load(PullRequest, [1, 2])
+        prs[1].merge()
+
+    assert store.load("PullRequest", [1, 2, 3]) == {1: ("merged", 1), 2: ("open", 1)}
+
+
+def test_loads_stored_states(store):
+    with store.unit_of_work() as unit_of_work:
+        unit_of_work.load(PullRequest, [1])[1].merge()
+
+    with store.unit_of_work() as unit_of_work:
+        pr = unit_of_work.load(PullRequest, [1])[1]
+        assert pr.state is Status.MERGED
+        assert unit_of_work.changes() == []
+        pr.reopen()
+        assert unit_of_work.changes() == [("PullRequest", 1, Status.OPEN, 1)]
+
+    assert store.load("PullRequest", [1]) == {1: ("open", 2)}
+
+
+def test_load_in_chunks(store):
+    ids = list(range(1200))
+    with store.unit_of_work() as unit_of_work:
+        unit_of_work.load(PullRequest, ids)
+
+    assert len(store.load("PullRequest", ids)) == 1200
+
+
+def test_commit_only_on_success(store):
+    with pytest.raises(KeyError):
+        with store.unit_of_work() as unit_of_work:
+            unit_of_work.load(PullRequest, [1])
+            raise KeyError
+
+    assert store.load("PullRequest", [1]) == {}
+
+
+def test_conflict_saves_nothing(database, store):
+    other = SQLiteStateStore(database)
+    with store.unit_of_work() as unit_of_work:
+        unit_of_work.load(PullRequest, [1, 2])
+
+    first = store.unit_of_work()
+    second = other.unit_of_work()
+    first_prs = first.load(PullRequest, [1, 2])
+    second.load(PullRequest, [1])[1].merge()
+    second.commit()
+
+    first_prs[1].merge()
+    first_prs[2].merge()
+    with pytest.raises(VersionConflict) as excinfo:
+        first.commit()
+    assert excinfo.value.keys == [("PullRequest", 1)]
+    assert "PullRequest:1" in str(excinfo.value)
+    assert store.load("PullRequest", [1, 2]) == {1: ("merged", 2), 2: ("open", 1)}
+
+    first.rollback()
+    assert first_prs[1].state is Status.OPEN
+    other.close()
+
+
+def test_concurrent_insert_conflicts(database, store):
+    other = SQLiteStateStore(database)
+    first = store.unit_of_work()
+    first.load(PullRequest, [1])
+    with other.unit_of_work() as second:
+        second.load(PullRequest, [1])
+
+    with pytest.raises(VersionConflict):
+        first.commit()
+    other.close()
+
+
+def test_run_retries_conflicts(database, store):
+    other = SQLiteStateStore(database)
+    with store.unit_of_work() as unit_of_work:
+        unit_of_work.load(PullRequest, [1])
+    attempts = []
+
+    def merge(unit_of_work):
+        pr = unit_of_work.load(PullRequest, [1])[1]
+        if not attempts:
+            # another worker reopens the pull request in the meantime
+            with other.unit_of_work() as concurrent:
+                concurrent.load(PullRequest, [1])[1].merge()
+            with other.unit_of_work() as concurrent:
+                concurrent.load(PullRequest, [1])[1].reopen()
+        attempts.append(pr.state)
+        pr.merge()
+        return "merged"
+
+    assert store.run(merge) == "merged"
+    assert attempts == [Status.OPEN, Status.OPEN]
+    assert store.load("PullRequest", [1]) == {1: ("merged", 4)}
+
+    def always_conflicts(unit_of_work):
+        pr = unit_of_work.load(PullRequest, [1])[1]
+        state, version = other.load("PullRequest", [1])[1]
+        other.save([("PullRequest", 1, state, version)])
+        pr.reopen()
+
+    with pytest.raises(VersionConflict):
+        store.run(always_conflicts, retries=1)
+    other.close()
+
+
+def test_add(store):
+    with store.unit_of_work() as unit_of_work:
+        unit_of_work.add("new", PullRequest("new"))
+    assert store.load("PullRequest", ["new"]) == {"new": ("open", 1)}
+
+
+def test_incomplete_store_cannot_be_created():
+    class LoadOnlyStore(StateStore):
+        def load(self, kind, machine_ids):
+            return {}
+
+    with pytest.raises(TypeError):
+        StateStore()
+    with pytest.raises(TypeError):
+        LoadOnlyStore()
+
+
+def test_invalid_table_name():
+    with pytest.raises(ValueError):
+        SQLiteStateStore(":memory:", table="states; DROP TABLE x")
@@ -0,0 +1,138 @@
+import asyncio
+
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.exceptions import InvalidStartState
+from finite_state_machine.stream import EventProcessor
+
+
+class Order(StateMachine):
+    def __init__(self, order_id):
+        self.state = "new"
+        self.order_id = order_id
+        self.log = []
+        super().__init__()
+
+    @transition(source="new", target="paid")
+    def pay(self, amount):
+        self.log.append(("pay", amount))
+        return amount
+
+    @transition(source="paid", target="shipped")
+    def ship(self, carrier="post"):
+        self.log.append(("ship", carrier))
+        return carrier
+
+    @transition(source="shipped", target="delivered")
+    def deliver(self):
+        raise RuntimeError("lost in transit")
+
+
+class AsyncOrder(Order):
+    running = 0
+    max_running = 0
+
+    @transition(source="new", target="paid")
+    async def pay(self, amount):
+        AsyncOrder.running += 1
+        AsyncOrder.max_running = max(AsyncOrder.max_running, AsyncOrder.running)
+        await asyncio.sleep(0.001)
+        AsyncOrder.running -= 1
+        self.log.append(("pay", amount))
+        return amount
+
+    @transition(source="paid", target="shipped")
+    async def ship(self, carrier="post"):
+        await asyncio.sleep(0)
+        self.log.append(("ship", carrier))
+        return carrier
+
+
+RECORDS = [
+    (1, "pay", 10),
+    (2, "pay", 20),
+    (1, "ship", {"carrier": "ups"}),
+    (2, "deliver", None),
+    (1, "deliver", None),
+]
+
+
+def test_process_sync_records():
+    processor = EventProcessor(Order)
+
+    results = processor.process(iter(RECORDS))
+    first = next(results)
+
+    assert first == (1, "pay", True, 10, None)
+    assert processor.stats.records == 1
+
+    results = [first, *results]
+    assert [result.ok for result in results] == [True, True, True, False, False]
+    assert isinstance(results[3].error, InvalidStartState)
+    assert isinstance(results[4].error, RuntimeError)
+    assert processor.machines[1].state == "shipped"
+    assert processor.machines[1].log == [("pay", 10), ("ship", "ups")]
+
+    stats = processor.stats
+    assert (stats.records, stats.applied, stats.rejected, stats.errors) == (5, 3, 1, 1)
+    assert stats.throughput > 0
+
+
+@pytest.mark.asyncio
+async def test_aprocess_keeps_per_entity_order():
+    processor = EventProcessor(AsyncOrder, max_in_flight=4)
+    records = []
+    for order_id in range(10):
+        records.append((order_id, "pay", order_id))
+        records.append((order_id, "ship", {"carrier": "ups"}))
+
+    results = [result async for result in processor.aprocess(records)]
+
+    assert len(results) == 20
+    assert all(result.ok for result in results)
+    for order_id, order in processor.machines.items():
+        assert order.log == [("pay", order_id), ("ship", "ups")]
+        assert order.state == "shipped"
+
+    stats = processor.stats
+    assert stats.max_in_flight == 4
+    assert 1 < AsyncOrder.max_running <= 4
+    assert stats.backpressure_waits > 0
+
+
+@pytest.mark.asyncio
+async def test_aprocess_async_iterator_with_sync_transitions():
+    async def records():
+        for record in RECORDS:
+            await asyncio.sleep(0)
+            yield record
+
+    processor = EventProcessor(Order, max_in_flight=2)
+
+    results = [result async for result in processor.aprocess(records())]
+
+    assert sorted((r.entity_id, r.event, r.ok) for r in results) == [
+        (1, "deliver", False),
+        (1, "pay", True),
+        (1, "ship", True),
+        (2, "deliver", False),
+        (2, "pay", True),
+    ]
+    assert processor.machines[1].state == "shipped"
+
+
+def test_existing_machines_are_used():
+    order = Order(1)
+    order.state = "paid"
+    processor = EventProcessor(Order, machines={1: order})
+
+    [result] = processor.process([(1, "ship", None)])
+
+    assert result.ok
+    assert order.state == "shipped"
+
+
+def test_max_in_flight_must_be_positive():
+    with pytest.raises(ValueError):
+        EventProcessor(Order, max_in_flight=0)
@@ -0,0 +1,220 @@
+import asyncio
+import json
+
+import pytest
+
+from finite_state_machine import StateMachine, transition
+from finite_state_machine.exceptions import ConditionsNotMet, TransitionTimeout
+
+from .conftest import is_powered
+
+# tracing needs contextvars and time.time_ns (Python 3.7+)
+pytest.importorskip("contextvars")
+
+from finite_state_machine.tracing import (  # noqa: E402
+    FileExporter,
+    Tracer,
+    current_span,
+)
+
+
+def lamp_is_plugged_in(machine):
+    return machine.lamp.powered
+
+
+async def has_bulb(machine):
+    await asyncio.sleep(0)
+    return True
+
+
+class Lamp(StateMachine):
+    def __init__(self):
+        self.state = "off"
+        self.powered = True
+        super().__init__()
+
+    @transition(source="off", target="on", conditions=[is_powered])
+    def turn_on(self):
+        return current_span()
+
+
+class Room(StateMachine):
+    def __init__(self):
+        self.state = "dark"
+        self.lamp = Lamp()
+        super().__init__()
+
+    @transition(source="dark", target="lit", conditions=[lamp_is_plugged_in])
+    def light(self):
+        self.lamp.turn_on()
+
+    @transition(
+        source="dark",
+        target="lit",
+        conditions=[has_bulb, lamp_is_plugged_in],
+        concurrent_conditions=True,
+    )
+    async def async_light(self):
+        await asyncio.sleep(0)
+        self.lamp.turn_on()
+
+
+class Download(StateMachine):
+    def __init__(self, seconds=0):
+        self.state = "queued"
+        self.seconds = seconds
+        super().__init__()
+
+    @transition(source="queued", target="done", on_error="failed", timeout=0.05)
+    async def fetch(self):
+        await asyncio.sleep(self.seconds)
+
+    @transition(source="queued", target="done", timeout=0.05)
+    async def fetch_all(self, downloads):
+        for download in downloads:
+            await download.fetch_or_wait()
+
+    @transition(source="queued", target="done")
+    async def fetch_or_wait(self):
+        await asyncio.sleep(self.seconds)
+
+    @transition(source="queued", target="done")
+    async def fetch_part(self, part):
+        await part.fetch()
+
+
+@pytest.fixture
+def tracer():
+    tracer = Tracer()
+    StateMachine.add_observer(tracer)
+    yield tracer
+    StateMachine.remove_observer(tracer)
+
+
+def by_name(spans):
+    return {span.name: span for span in spans}
+
+
+def test_transition_span_has_condition_and_function_children(tracer):
+    lamp = Lamp()
+
+    running_span = lamp.turn_on()
+
+    spans = by_name(tracer.exporter.spans)
+    assert set(spans) == {"Lamp.turn_on", "is_powered", "turn_on"}
+    parent = spans["Lamp.turn_on"]
+    assert parent.parent_id is None
+    assert parent.status == "OK"
+    assert parent.attributes == {
+        "fsm.machine": "Lamp",
+        "fsm.transition": "turn_on",
+        "fsm.source": "off",
+        "fsm.target": "on",
+    }
+    assert spans["is_powered"].parent_id == parent.span_id
+    assert spans["is_powered"].attributes["fsm.condition.passed"] is True
+    assert spans["turn_on"].parent_id == parent.span_id
+    assert running_span is spans["turn_on"]
+    assert parent.duration >= spans["turn_on"].duration
+    assert current_span() is None
+
+
+def test_nested_transitions_are_children(tracer):
+    room = Room()
+
+    room.light()
+
+    spans = by_name(tracer.exporter.spans)
+    assert spans["Lamp.turn_on"].parent_id == spans["light"].span_id
+    trace_ids = {span.trace_id for span in tracer.exporter.spans}
+    assert len(trace_ids) == 1
+
+
+@pytest.mark.asyncio
+async def test_async_transition_with_concurrent_conditions(tracer):
+    room = Room()
+
+    await room.async_light()
+
+    spans = by_name(tracer.exporter.spans)
+    parent = spans["Room.async_light"]
+    assert spans["has_bulb"].parent_id == parent.span_id
+    assert spans["lamp_is_plugged_in"].parent_id == parent.span_id
+    assert spans["async_light"].parent_id == parent.span_id
+    assert spans["Lamp.turn_on"].parent_id == spans["async_light"].span_id
+    assert current_span() is None
+
+
+def test_rejected_transition_reports_original_conditions(tracer):
+    lamp = Lamp()
+    lamp.powered = False
+
+    with pytest.raises(ConditionsNotMet) as excinfo:
+        lamp.turn_on()
+
+    assert excinfo.value.conditions == [is_powered]
+    spans = by_name(tracer.exporter.spans)
+    assert spans["is_powered"].attributes["fsm.condition.passed"] is False
+    assert spans["Lamp.turn_on"].status == "ERROR"
+    assert spans["Lamp.turn_on"].attributes["fsm.error"] == "ConditionsNotMet"
+    assert "turn_on" not in spans
+
+
+def test_untraced_transitions_record_nothing():
+    lamp = Lamp()
+
+    assert lamp.turn_on() is None
+
+
+def test_file_exporter(tmp_path):
+    path = tmp_path / "spans.jsonl"
+    exporter = FileExporter(str(path))
+    tracer = Tracer(exporter)
+    Lamp.add_observer(tracer)
+    try:
+        Lamp().turn_on()
+    finally:
+        Lamp.remove_observer(tracer)
+        exporter.close()
+
+    spans = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [span["name"] for span in spans] == ["is_powered", "turn_on", "Lamp.turn_on"]
+    assert spans[2]["status"] == {"code": "OK", "message": ""}
+    assert spans[0]["parentSpanId"] == spans[2]["spanId"]
+
+
+@pytest.mark.asyncio
+async def test_timeout_of_nested_transition(tracer):
+    download = Download()
+
+    await download.fetch_part(Download(seconds=1))
+
+    assert download.state == "done"
+    spans = by_name(tracer.exporter.spans)
+    assert spans["Download.fetch"].status == "ERROR"
+    assert spans["Download.fetch"].attributes["fsm.error"] == "TransitionTimeout"
+    assert spans["Download.fetch"].parent_id == spans["fetch_part"].span_id
+    assert spans["Download.fetch_part"].status == "OK"
+    assert current_span() is None
+
+
+@pytest.mark.asyncio
+async def test_timeout_cancels_nested_transition(tracer):
+    download = Download()
+
+    with pytest.raises(TransitionTimeout):
+        await download.fetch_all([Download(), Download(seconds=1)])
+
+    spans = tracer.exporter.spans
+    assert [span.name for span in spans if span.name.startswith("Download.")] == [
+        "Download.fetch_or_wait",
+        "Download.fetch_or_wait",
+        "Download.fetch_all",
+    ]
+    assert [span.status for span in spans if span.name.startswith("Download.")] == [
+        "OK",
+        "ERROR",
+        "ERROR",
+    ]
+    assert spans[-1].attributes["fsm.error"] == "TransitionTimeout"
+    assert current_span() is None